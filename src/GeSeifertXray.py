@@ -4,10 +4,81 @@ __author__="gabriele.giambartolomei@desy.de"
 __date__ ="June, 2015, 10:56 AM"
 __copyright__="Copyright (c) 2010-2015 European XFEL GmbH Hamburg. All rights reserved."
 
+import socket
+import threading
+import time
+
 from scpi.scpi_device_2 import *
 
+from SeifertXrayConfirmed import ConfirmedSetpoints
+from SeifertXrayCountdown import ExposureCountdown
+from SeifertXrayMetrics import LatencyRecorder, PhaseProfiler, RingBuffer, processStartTime
+from SeifertXrayPriority import POLL, SAFETY, SETPOINT, PriorityLock
+from SeifertXrayScheduler import SeifertXrayScheduler
+from SeifertXrayStatus import STATUS_WORD_SCHEMA, interlockFault
+from SeifertXrayValues import deriveExposureTimer, deriveValues
+from SeifertXrayTransport import (AliasPlan, ReconnectBackoff, SeifertXrayAsyncTransport, SeifertXrayConnection,
+                                  TrafficRecorder, isConnectionError, openSocket)
+
 @KARABO_CLASSINFO("GeSeifertXray", "1.0 1.1 1.2 1.3 1.4")
 class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
+    
+    # Commands sent before any other traffic waiting for the connection, the other
+    # commands before the poll queries, see PriorityLock
+    SAFETY_COMMANDS = ("on", "off", "openShutter", "closeShutter", "beamshutter.control")
+    
+    # Status words queried by the interlock watch, see runInterlockWatch
+    INTERLOCK_KEYS = ("statusMassage.statusWord12", "sw.statusWord1")
+    
+    # Polled parameters affected by a command, read back right after sending it
+    READBACKS = {
+        "on": ("sw.statusWord1",),
+        "off": ("sw.statusWord1",),
+        "current.setpoint": ("current.target", "current.actual"),
+        "voltage.setpoint": ("voltage.target", "voltage.actual"),
+        "sw.statusWord14": ("sw.statusWord14Actual",),
+        "setExposureTimerValues": ("exposuretimer.target",),
+        "setExposureTimerOn": ("sw.statusWord2", "exposuretimerActual.totalSec"),
+        "setExposureTimerOff": ("sw.statusWord2", "exposuretimerActual.totalSec"),
+        "acknowledgeError": ("statusMassage.statusWord12",),
+        "setWarmupProgram": ("sw.statusWord6", "warmup.timeleft"),
+        "openShutter": ("sw.statusWord4",),
+        "closeShutter": ("sw.statusWord4",),
+    }
+    
+    # Aliases compiled once per class, see compileAliases
+    aliasPlans = None # key -> AliasPlan
+    pollTiers = None # tier name -> list of AliasPlan of the parameters tagged "poll <tier>"
+    
+    # Setpoint -> readback confirming it. A setpoint write is not sent when a
+    # readback queried after the last write and at most confirmationAge ago
+    # holds the value, unless forceWrites is set
+    CONFIRMING_READBACKS = {
+        "current.setpoint": "current.target",
+        "voltage.setpoint": "voltage.target",
+        "sw.statusWord14": "sw.statusWord14Actual",
+    }
+    
+    # Ramped setpoint -> (target readback, actual readback, rate parameter)
+    RAMPS = {
+        "voltage.setpoint": ("voltage.target", "voltage.actual_kilo", "ramp.voltageRate"),
+        "current.setpoint": ("current.target", "current.actual_milli", "ramp.currentRate"),
+    }
+    
+    # Polled parameter -> statistics of its recent history
+    HISTORY = {
+        "current.actual": "history.currentActual",
+        "voltage.actual": "history.voltageActual",
+        "sw.statusWord15": "history.waterFlow",
+        "exposuretimerActual.totalSec": "history.exposureTimer",
+    }
+    
+    # Time taken by the last expectedParameters, in s
+    schemaBuildTime = None
+    
+    # Setpoints sent again in one batch after reconnecting to the generator
+    RESTORED_SETPOINTS = ("current.setpoint", "voltage.setpoint", "sw.statusWord14",
+                          "keypadOnOff.OnOff", "beamshutter.control")
 
     def __init__(self, configuration):
         # always call superclass constructor first!
@@ -15,6 +86,48 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
         
         self.commandTerminator = "\n" # The command terminator
         self.socketTimeout = 1.0 # Default timeout value for write/read, can be increased if necessary
+        
+        self.lastPublished = {} # Last published value of each derived property
+        self.pollCycle = 0 # Number of poll cycles since the last full refresh
+        
+        # Polled parameters are queried by this device, see pollInstrumentSpecific
+        self.socketConnection = SeifertXrayConnection(self.commandTerminator, self.socketTimeout,
+                                                      self.get("tcpKeepAlive"))
+        self.asyncTransport = None # Used instead of the base class socket with transport "asyncio"
+        self.connection = None # The one of the two in use, see openConnection
+        self.ioLock = PriorityLock() # Serializes the socket, commands before poll queries
+        self.staticPolled = False # Static parameters are read once per connection
+        self.nextSlowPoll = 0.
+        self.publishLock = threading.Lock() # Poll cycles and readbacks both publish
+        self.confirmed = ConfirmedSetpoints() # Setpoint -> value of its confirming readback
+        self.suppressedWrites = 0
+        self.reconnectLock = threading.Lock()
+        self.reconnecting = False # A reconnect thread is running
+        self.stopping = False
+        self.rampThread = None
+        self.rampCancelled = threading.Event()
+        self.history = dict((key, RingBuffer(self.get("history.capacity"))) for key in self.HISTORY)
+        self.countdown = ExposureCountdown() # Exposure timer 3 predicted while running
+        self.countdownThread = None
+        self.interlockThread = None
+        self.interlockLock = threading.Lock()
+        self.interlockTripped = False # A critical fault was reported and not cleared yet
+        self.latency = LatencyRecorder() # Round-trip times by command mnemonic
+        self.nextStatisticsPublish = 0.
+        self.profiler = PhaseProfiler(self.get("profiler.cycles")) # Poll cycle phases, see toggleProfiling
+        self.recorder = None # Capture of the traffic, see updateCapture
+        self.startupPublished = False
+        self.scheduler = None
+        if self.get("sharedScheduler") and self.get("transport") != "asyncio":
+            self.log.WARN("The shared scheduler needs transport asyncio, polling from this device")
+        elif self.get("sharedScheduler"):
+            # Polled by the scheduler shared by all generators of the process
+            self.scheduler = SeifertXrayScheduler.shared(self.get("schedulerWorkers"))
+            self.scheduler.register(self, self.pollCycleAsync, lambda: self.get("pollPeriod"),
+                                    lambda e: self.log.ERROR("Poll cycle failed: {}".format(e)))
+            self.scheduler.register((self, "interlock"), self.watchInterlockAsync,
+                                    lambda: self.get("interlock.period"),
+                                    lambda e: self.log.WARN("Interlock query failed: {}".format(e)))
     
     ### Register and Define additional slots ###
         
@@ -37,14 +150,30 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
         sigslot.registerSlot(self.openShutter)
         
         sigslot.registerSlot(self.closeShutter)
+        
+        sigslot.registerSlot(self.cancelRamp)
+        
+        sigslot.registerSlot(self.toggleProfiling)
                                                        
 
     def setVoltageCurrent(self):
-        ''' Will set the voltage and current setpoints at once'''
-        try:
-            self.sendCommand("setVoltageCurrent")
-        except:
-            raise
+        ''' Will ramp the voltage and current to their setpoints in the background'''
+        self.startRamp({"voltage.setpoint": self.get("voltage.setpoint"),
+                        "current.setpoint": self.get("current.setpoint")})
+    
+    def cancelRamp(self):
+        ''' Stop a running ramp at its current step '''
+        if self.rampThread is not None and self.rampThread.is_alive():
+            self.rampCancelled.set()
+            if self.rampThread is not threading.current_thread():
+                self.rampThread.join()
+
+    def toggleProfiling(self):
+        ''' Start or stop profiling the phases of the poll cycles '''
+        self.profiler.enabled = not self.profiler.enabled
+        if self.profiler.enabled:
+            self.profiler.clear()
+        self.set("profiler.enabled", self.profiler.enabled)
 
     def setExposureTimerOn(self):
         ''' Will turn the specified Exposure Timer On'''
@@ -97,6 +226,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
     
     @staticmethod
     def expectedParameters(expected):
+        start = time.perf_counter()
         (
         
         ### Override scpi_device parameters ###
@@ -123,7 +253,170 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .allowedStates("Ok.On")
                 .commit(),
     
+        UINT32_ELEMENT(expected).key("fullRefreshCycles")
+                .displayedName("Full Refresh Cycles")
+                .description("Derived properties are only published when their value changes. "
+                "Every N poll cycles all of them are published anyway, 0 = never.")
+                .assignmentOptional().defaultValue(0)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        # Parameters tagged "poll fast" are queried every cycle, "poll slow" ones
+        # every slowPollPeriod and "poll static" ones once after connecting
+        DOUBLE_ELEMENT(expected).key("slowPollPeriod")
+                .displayedName("Slow Poll Period")
+                .description("Period for polling the slowly changing parameters.")
+                .assignmentOptional().defaultValue(10.)
+                .minInc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("pipelinedPolling")
+                .displayedName("Pipelined Polling")
+                .description("Send all queries of a poll cycle at once and match the replies by position, "
+                "instead of waiting for each reply before sending the next query.")
+                .assignmentOptional().defaultValue(False)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("pipelineTimeout")
+                .displayedName("Pipeline Timeout")
+                .description("Time within which all replies of a pipelined poll cycle must arrive.")
+                .assignmentOptional().defaultValue(2.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("readbackDelay")
+                .displayedName("Readback Delay")
+                .description("Delay after a command before the parameters it affects are read back, "
+                "without waiting for the next poll cycle.")
+                .assignmentOptional().defaultValue(0.2)
+                .minInc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
                         
+        STRING_ELEMENT(expected).key("transport")
+                .displayedName("Transport")
+                .description("socket: blocking I/O on the base class socket. "
+                "asyncio: non-blocking I/O on an event loop shared by all devices of the server, "
+                "commands are not held up by slow replies.")
+                .assignmentOptional().defaultValue("socket")
+                .options("socket asyncio")
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("sharedScheduler")
+                .displayedName("Shared Scheduler")
+                .description("Poll from the event loop shared by all GeSeifertXray devices of the server "
+                "and derive the published values in a shared worker pool, instead of polling from "
+                "a thread of this device. Needs transport asyncio.")
+                .assignmentOptional().defaultValue(False)
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        UINT32_ELEMENT(expected).key("schedulerWorkers")
+                .displayedName("Scheduler Workers")
+                .description("Threads of the shared worker pool, set by the first device started.")
+                .assignmentOptional().defaultValue(4)
+                .minInc(1)
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("pollPeriod")
+                .displayedName("Poll Period")
+                .description("Period of the poll cycles of the shared scheduler.")
+                .assignmentOptional().defaultValue(1.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        # Connection management
+        BOOL_ELEMENT(expected).key("tcpKeepAlive")
+                .displayedName("TCP Keep-Alive")
+                .description("Enable TCP keep-alive probes, so that a dead terminal server is detected "
+                "even when no reply is awaited.")
+                .assignmentOptional().defaultValue(True)
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("reconnectDelay")
+                .displayedName("Reconnect Delay")
+                .description("Delay before the first reconnection attempt after the connection was lost, "
+                "doubled after every failed attempt up to Reconnect Delay Max.")
+                .assignmentOptional().defaultValue(0.5)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("reconnectDelayMax")
+                .displayedName("Reconnect Delay Max")
+                .description("Maximum delay between two reconnection attempts.")
+                .assignmentOptional().defaultValue(30.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("forceWrites")
+                .displayedName("Force Writes")
+                .description("Always send setpoints, also when the generator already reports the value.")
+                .assignmentOptional().defaultValue(False)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("confirmationAge")
+                .displayedName("Confirmation Age")
+                .description("A setpoint write is only suppressed when the generator reported the value "
+                "at most this long ago. Values changed on the keypad are seen only once read back.")
+                .assignmentOptional().defaultValue(2.)
+                .minInc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        UINT32_ELEMENT(expected).key("suppressedWrites")
+                .displayedName("Suppressed Writes")
+                .description("Number of setpoint writes not sent because the generator already reported the value.")
+                .expertAccess()
+                .readOnly().initialValue(0)
+                .commit(),
+        
+        STRING_ELEMENT(expected).key("connectionHealth")
+                .displayedName("Connection Health")
+                .description("CONNECTED, RECONNECTING after the connection was lost (setpoints are "
+                "restored once it is back) or DISCONNECTED before the first connection.")
+                .readOnly().initialValue("DISCONNECTED")
+                .commit(),
+        
+        STRING_ELEMENT(expected).key("captureFile")
+                .displayedName("Capture File")
+                .description("Capture all commands and replies with their times to this gzip compressed file, "
+                "which SeifertXrayHwSimulator can replay. Empty: no capture.")
+                .assignmentOptional().defaultValue("")
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
         ### Define specific parameters ###
     
         # Define node for Current Setpoint
@@ -145,7 +438,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),
         
         INT32_ELEMENT(expected).key("current.target")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;CN;*{current.target:d};")
                 .displayedName("Target Current Setpoint")
                 .description("The target value of the Current Setpoint.")
@@ -154,7 +447,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),  
                 
         INT32_ELEMENT(expected).key("current.actual")
-                .tags("scpi poll")
+                .tags("poll fast")
                 .alias(";;CA;*{current.actual:d};")
                 .displayedName("Actual Current Setpoint")
                 .description("The actual value of the Current Setpoint.")
@@ -190,7 +483,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),
         
         INT32_ELEMENT(expected).key("voltage.target")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;VN;*{voltage.target:d};")
                 .displayedName("Target Voltage Setpoint")
                 .description("The target value of the Voltage Setpoint.")
@@ -199,7 +492,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(), 
                 
         INT32_ELEMENT(expected).key("voltage.actual")
-                .tags("scpi poll")
+                .tags("poll fast")
                 .alias(";;VA;*{voltage.actual:d};")
                 .displayedName("Actual Voltage Setpoint")
                 .description("The actual value of the Voltage Setpoint.")
@@ -214,6 +507,331 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .readOnly() 
                 .commit(),
     
+        # Ramping of the voltage and current setpoints
+        NODE_ELEMENT(expected).key("ramp")
+                .displayedName("Ramp")
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("ramp.voltageRate")
+                .displayedName("Voltage Ramp Rate")
+                .description("Rate at which the voltage is ramped to its setpoint in 1 kV steps, "
+                "0 = set the voltage at once.")
+                .assignmentOptional().defaultValue(0.)
+                .minInc(0.)
+                .unit(Unit.VOLT_PER_SECOND).metricPrefix(MetricPrefix.KILO)
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("ramp.currentRate")
+                .displayedName("Current Ramp Rate")
+                .description("Rate at which the current is ramped to its setpoint in 1 mA steps, "
+                "0 = set the current at once.")
+                .assignmentOptional().defaultValue(0.)
+                .minInc(0.)
+                .unit(Unit.AMPERE_PER_SECOND).metricPrefix(MetricPrefix.MILLI)
+                .reconfigurable()
+                .commit(),
+        
+        INT32_ELEMENT(expected).key("ramp.tolerance")
+                .displayedName("Ramp Step Tolerance")
+                .description("Maximum difference between a ramp step and the value read back "
+                "(actual value with high voltage on, else target value) before the next step.")
+                .assignmentOptional().defaultValue(1)
+                .minInc(0)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("ramp.settleTimeout")
+                .displayedName("Ramp Step Timeout")
+                .description("Time for a ramp step to be read back within tolerance, else the ramp is aborted.")
+                .assignmentOptional().defaultValue(5.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("ramp.active")
+                .displayedName("Ramp Active")
+                .readOnly().initialValue(False)
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("ramp.progress")
+                .displayedName("Ramp Progress")
+                .unit(Unit.PERCENT)
+                .readOnly().initialValue(0.)
+                .commit(),
+        
+        STRING_ELEMENT(expected).key("ramp.status")
+                .displayedName("Ramp Status")
+                .readOnly().initialValue("")
+                .commit(),
+        
+        SLOT_ELEMENT(expected).key("setVoltageCurrent")
+                .displayedName("Set Voltage and Current")
+                .description("Ramp voltage and current to their setpoints.")
+                .allowedStates("Ok.On Ok.Off")
+                .commit(),
+        
+        SLOT_ELEMENT(expected).key("cancelRamp")
+                .displayedName("Cancel Ramp")
+                .description("Stop ramping at the current step.")
+                .commit(),
+        
+        # Short term history of the polled values
+        NODE_ELEMENT(expected).key("history")
+                .displayedName("History")
+                .commit(),
+        
+        UINT32_ELEMENT(expected).key("history.capacity")
+                .displayedName("History Capacity")
+                .description("Number of polled values kept per parameter, the oldest are dropped.")
+                .assignmentOptional().defaultValue(3600)
+                .minInc(1)
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("history.window")
+                .displayedName("Statistics Window")
+                .description("The statistics are computed over the values of this last period.")
+                .assignmentOptional().defaultValue(60.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .reconfigurable()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("history.currentActual")
+                .displayedName("Actual Current Statistics")
+                .description("Min, max, mean and standard deviation of the actual current.")
+                .unit(Unit.AMPERE).metricPrefix(MetricPrefix.MICRO)
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("history.voltageActual")
+                .displayedName("Actual Voltage Statistics")
+                .description("Min, max, mean and standard deviation of the actual voltage.")
+                .unit(Unit.VOLT)
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("history.waterFlow")
+                .displayedName("Water Flow Rate Statistics")
+                .description("Min, max, mean and standard deviation of the water flow rate.")
+                .unit(Unit.HERTZ)
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("history.exposureTimer")
+                .displayedName("Exposure Timer Statistics")
+                .description("Min, max, mean and standard deviation of the exposure timer actual value.")
+                .unit(Unit.SECOND)
+                .readOnly()
+                .commit(),
+        
+        # Round-trip times of the commands, one vector element per command
+        NODE_ELEMENT(expected).key("latency")
+                .displayedName("Latency")
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("latency.publishPeriod")
+                .displayedName("Publish Period")
+                .description("Period for publishing the latency and profiler statistics and writing their files.")
+                .assignmentOptional().defaultValue(10.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        STRING_ELEMENT(expected).key("latency.file")
+                .displayedName("Latency File")
+                .description("File the latency histograms are written to in the Prometheus text format, "
+                "e.g. for the textfile collector of the node exporter. Empty: not written.")
+                .assignmentOptional().defaultValue("")
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        VECTOR_STRING_ELEMENT(expected).key("latency.commands")
+                .displayedName("Commands")
+                .description("Command mnemonics, pipelined poll cycles are counted as 'pipeline'.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("latency.p50")
+                .displayedName("Median")
+                .description("Median round-trip time of each command, writes until sent.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("latency.p95")
+                .displayedName("95th Percentile")
+                .description("95th percentile of the round-trip time of each command.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("latency.p99")
+                .displayedName("99th Percentile")
+                .description("99th percentile of the round-trip time of each command.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("latency.max")
+                .displayedName("Maximum")
+                .description("Maximum round-trip time of each command.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_UINT32_ELEMENT(expected).key("latency.timeouts")
+                .displayedName("Timeouts")
+                .description("Number of times each command got no reply within the timeout.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        UINT32_ELEMENT(expected).key("latency.garbageBytes")
+                .displayedName("Garbage Bytes")
+                .description("Number of received bytes dropped because they were no valid reply or "
+                "arrived after their query timed out (socket transport).")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        # Commands waiting for the connection, by priority level
+        NODE_ELEMENT(expected).key("commandQueue")
+                .displayedName("Command Queue")
+                .description("Commands and poll queries waiting for the connection to the generator. "
+                "Safety commands (HV on/off, shutter) go first, then setpoints, then poll queries.")
+                .commit(),
+        
+        VECTOR_STRING_ELEMENT(expected).key("commandQueue.levels")
+                .displayedName("Levels")
+                .description("Priority levels, most urgent first.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_UINT32_ELEMENT(expected).key("commandQueue.depth")
+                .displayedName("Depth")
+                .description("Waiting per level when last published.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_UINT32_ELEMENT(expected).key("commandQueue.maxDepth")
+                .displayedName("Maximum Depth")
+                .description("Most waiting per level since the start.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("commandQueue.waitP99")
+                .displayedName("Wait p99")
+                .description("99th percentile of the wait for the connection per level.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("commandQueue.waitMax")
+                .displayedName("Wait Maximum")
+                .description("Longest wait for the connection per level.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        # Time spent in the phases of the poll cycles
+        NODE_ELEMENT(expected).key("profiler")
+                .displayedName("Profiler")
+                .commit(),
+        
+        SLOT_ELEMENT(expected).key("toggleProfiling")
+                .displayedName("Toggle Profiling")
+                .description("Start or stop profiling the poll cycles.")
+                .expertAccess()
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("profiler.enabled")
+                .displayedName("Profiling")
+                .expertAccess()
+                .readOnly().initialValue(False)
+                .commit(),
+        
+        UINT32_ELEMENT(expected).key("profiler.cycles")
+                .displayedName("Profiled Cycles")
+                .description("The statistics and the trace are made of this many last poll cycles.")
+                .assignmentOptional().defaultValue(100)
+                .minInc(1)
+                .expertAccess()
+                .init()
+                .commit(),
+        
+        STRING_ELEMENT(expected).key("profiler.traceFile")
+                .displayedName("Trace File")
+                .description("File the profiled cycles are written to as Chrome trace events, "
+                "for chrome://tracing or Perfetto. Empty: not written.")
+                .assignmentOptional().defaultValue("")
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        VECTOR_STRING_ELEMENT(expected).key("profiler.phases")
+                .displayedName("Phases")
+                .description("schedule: choosing the due parameters, io: waiting for the replies, "
+                "parse: parsing them, derive: deriving values, history: statistics of the history, "
+                "publish: sending the changed values to the broker.")
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("profiler.mean")
+                .displayedName("Mean")
+                .description("Mean time per cycle spent in each phase.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        VECTOR_DOUBLE_ELEMENT(expected).key("profiler.max")
+                .displayedName("Maximum")
+                .description("Maximum time per cycle spent in each phase.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        NODE_ELEMENT(expected).key("startup")
+                .displayedName("Startup")
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("startup.schemaBuild")
+                .displayedName("Schema Build")
+                .description("Time taken to build the schema of this class.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("startup.firstPoll")
+                .displayedName("First Poll")
+                .description("Time from the start of the process to the first published poll cycle.")
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .readOnly()
+                .commit(),
+    
         # Define and configure the Exposure Timers
         
         NODE_ELEMENT(expected).key("exposuretimer")
@@ -251,7 +869,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(), 
         
         INT32_ELEMENT(expected).key("exposuretimer.target")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;TN:3;*{exposuretimer.target:d};") 
                 .displayedName("Exposure Timer 3 target value [sec]")
                 .description("Exposure Timer 3 target value [sec]")                
@@ -315,7 +933,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),    
                         
         INT32_ELEMENT(expected).key("exposuretimerActual.totalSec")
-                .tags("scpi poll")
+                .tags("poll fast")
                 .alias(";;TA:3;*{exposuretimerActual.totalSec:d};") 
                 .displayedName("Exposure Timer actual value [sec]")
                 .description("Exposure Timer actual value [sec]")                
@@ -323,6 +941,46 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .readOnly()
                 .commit(),
         
+        # While timer 3 runs its actual value is predicted instead of polled
+        NODE_ELEMENT(expected).key("countdown")
+                .displayedName("Exposure Timer Countdown")
+                .commit(),
+        
+        BOOL_ELEMENT(expected).key("countdown.enabled")
+                .displayedName("Local Countdown")
+                .description("While exposure timer 3 runs, count its actual value down locally and only "
+                "query it every Resync Period and when the timer is started or stopped.")
+                .assignmentOptional().defaultValue(False)
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("countdown.displayRate")
+                .displayedName("Display Rate")
+                .description("Rate at which the predicted actual value is updated.")
+                .assignmentOptional().defaultValue(4.)
+                .minExc(0.).maxInc(50.)
+                .unit(Unit.HERTZ)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("countdown.resyncPeriod")
+                .displayedName("Resync Period")
+                .description("Period for querying the actual value of the running timer.")
+                .assignmentOptional().defaultValue(30.)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
+                .commit(),
+        
+        DOUBLE_ELEMENT(expected).key("countdown.drift")
+                .displayedName("Drift")
+                .description("Predicted minus measured actual value at the last resync.")
+                .unit(Unit.SECOND)
+                .readOnly()
+                .commit(),
+        
         
         # Read and clear status message
         
@@ -331,7 +989,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),   
                 
         INT32_ELEMENT(expected).key("statusMassage.statusWord12")
-                .tags("scpi poll")
+                .tags("poll fast")
                 .alias(";;SR:12;*{statusMassage.statusWord12:d};") 
                 .displayedName("Status Word 12 Code")
                 .description("Status Word 12 Code.")        
@@ -350,87 +1008,59 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .displayedName("Acknowledge Error")
                 .description("Cancellation of message.")
                 .commit(),
-              
-        # Read and display Status Words
         
-        NODE_ELEMENT(expected).key("sw")
-                .displayedName("Status Words")
-                .commit(),  
-             
-        INT32_ELEMENT(expected).key("sw.statusWord1")
-                .tags("scpi poll")
-                .alias(";;SR:01;*{sw.statusWord1:d};") 
-                .displayedName("Status Word 1")
-                .description("Status Word 1 decimal value.")                 
-                .readOnly()                               
-                .commit(),
-        
-        STRING_ELEMENT(expected).key("sw.statusWord1Bin")
-                .displayedName("Status Word 1 binary")
-                .description("Status Word 1: "
-                "Ext.Computer Control|High Voltage|Cooling Circuit|Buffer Battery|mA Nom=Actual|kV Nom=Actual|Shutter Status|Not used ")
-                .readOnly()
-                .commit(),                                
-        
-        INT32_ELEMENT(expected).key("sw.statusWord2")
-                .tags("scpi poll")
-                .alias(";;SR:02;*{sw.statusWord2:d};") 
-                .displayedName("Status Word 2")
-                .description("Status Word 2 decimal value.")                
-                .readOnly()                 
+        # Watch for critical faults out of the poll cycle
+        NODE_ELEMENT(expected).key("interlock")
+                .displayedName("Interlock Watch")
                 .commit(),
-                
-        STRING_ELEMENT(expected).key("sw.statusWord2Bin")
-                .displayedName("Status Word 2 binary")
-                .description("Status Word 2: "
-                "Timer1|Timer2|Timer3|Timer4|ShutterControl1|ShutterControl2|ShutterControl3|ShutterControl4 ")  
-                .readOnly()
+        
+        BOOL_ELEMENT(expected).key("interlock.enabled")
+                .displayedName("Enabled")
+                .description("Query Status Word 12 and Status Word 1 every Interlock Period instead of in the "
+                "poll cycle, and go to the error state at once on a critical fault: cooling system failed (33 "
+                "or Status Word 1 bit 32), EMERGENCY-STOP (46), tube overpower (50), shutter safety circuit open (112).")
+                .assignmentOptional().defaultValue(True)
+                .reconfigurable()
                 .commit(),
         
-        INT32_ELEMENT(expected).key("sw.statusWord3")
-                .tags("scpi poll")
-                .alias(";;SR:03;*{sw.statusWord3:d};") 
-                .displayedName("Status Word 3")
-                .description("Status Word 3 decimal value.")                
-                .readOnly()                 
+        DOUBLE_ELEMENT(expected).key("interlock.period")
+                .displayedName("Interlock Period")
+                .description("Period of the interlock queries.")
+                .assignmentOptional().defaultValue(0.1)
+                .minExc(0.)
+                .unit(Unit.SECOND)
+                .expertAccess()
+                .reconfigurable()
                 .commit(),
-                
-        STRING_ELEMENT(expected).key("sw.statusWord3Bin")
-                .displayedName("Status Word 3 binary")
-                .description("Status Word 3: "
-                "Shutter1Command|Shutter1Status|Shutter1 Non-Syst.Closed|Shutter1Connected|Shutter2Command|Shutter2Status|Shutter2 Non-syst.Closed|Shutter2Connected ")   
+        
+        BOOL_ELEMENT(expected).key("interlock.tripped")
+                .displayedName("Tripped")
+                .description("A critical fault was reported, until the generator reports none anymore.")
                 .readOnly()
                 .commit(),
         
-        INT32_ELEMENT(expected).key("sw.statusWord4")
-                .tags("scpi poll")
-                .alias(";;SR:04;*{sw.statusWord4:d};") 
-                .displayedName("Status Word 4")
-                .description("Status Word 4 decimal value.")                
-                .readOnly()                
+        STRING_ELEMENT(expected).key("interlock.fault")
+                .displayedName("Fault")
+                .description("The last critical fault reported.")
+                .readOnly()
                 .commit(),
-                
-        STRING_ELEMENT(expected).key("sw.statusWord4Bin")
-                .displayedName("Status Word 4 binary")
-                .description("Status Word 4: "
-                "Shutter3Command|Shutter3Status|Shutter3 Non-Syst.Closed|Shutter3Connected|Shutter4Command|Shutter4Status|Shutter4 Non-syst.Closed|Shutter4Connected ")  
+        
+        DOUBLE_ELEMENT(expected).key("interlock.reactionTime")
+                .displayedName("Reaction Time")
+                .description("Time from sending the query which found the last critical fault to the error state.")
+                .unit(Unit.SECOND).metricPrefix(MetricPrefix.MILLI)
+                .expertAccess()
                 .readOnly()
                 .commit(),
+              
+        # Read and display Status Words, generated from the decoding tables
         
-        INT32_ELEMENT(expected).key("sw.statusWord6")
-                .tags("scpi poll")
-                .alias(";;SR:06;*{sw.statusWord6:d};") 
-                .displayedName("Status Word 6")
-                .description("Status Word 6 decimal value.")        
-                .readOnly()                 
+        NODE_ELEMENT(expected).key("sw")
+                .displayedName("Status Words")
                 .commit(),
-                
-        STRING_ELEMENT(expected).key("sw.statusWord6Bin")
-                .displayedName("Status Word 6 binary")
-                .description("Status Word 6: "
-                "Not Used|Not Used|Not Used|Not Used|Warm-up Progr.|Warm-up Aborted|Warm-up via Ext.Computer|Warm-up via Keeyboard ")             
-                .readOnly()
-                .commit(),      
+        )
+        GeSeifertXray.statusWordElements(expected)
+        (
         
         # Set and read the Water Flow Rate
         INT32_ELEMENT(expected).key("sw.statusWord14")
@@ -446,7 +1076,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),
         
         INT32_ELEMENT(expected).key("sw.statusWord14Actual")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;SR:14;*{sw.statusWord14Actual:d};") 
                 .displayedName("Minimum Water Flow Rate actual value")
                 .description("Minimum Water Flow Rate actual value. Min 181Hz, Max 250Hz")        
@@ -454,228 +1084,16 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(), 
         
         INT32_ELEMENT(expected).key("sw.statusWord15")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;SR:15;*{sw.statusWord15:d};") 
                 .displayedName("Water Flow Rate actual")
                 .description("Water Flow Rate actual value. Max 250Hz")  
                 .unit(Unit.HERTZ)
                 .readOnly()                 
                 .commit(),         
-    
-        # Status Word 1        
-        STRING_ELEMENT(expected).key("extComputerControl")
-                .displayedName("Ext. Computer Control")
-                .description("Ext. Computer Control: ON | OFF")
-                .readOnly()
-                .commit(),
-                
-        STRING_ELEMENT(expected).key("highVoltageStatus")
-                .displayedName("High Voltage")
-                .description("High Voltage: ON | OFF")
-                .readOnly()
-                .commit(),
-         
-        STRING_ELEMENT(expected).key("coolingCircuit")
-                .displayedName("Cooling Circuit")
-                .description("Cooling Circuit: OK | NOT OK")
-                .readOnly()
-                .commit(),  
-                
-        STRING_ELEMENT(expected).key("bufferBattery")
-                .displayedName("Buffer Battery")
-                .description("Buffer Battery: OK | EMPTY")
-                .readOnly()
-                .commit(),
-         
-        STRING_ELEMENT(expected).key("mANomActual")
-                .displayedName("mA Nom=Actual")
-                .description("mA Nom=Actual: OK | NOT OK")
-                .readOnly()
-                .commit(),        
-        
-        STRING_ELEMENT(expected).key("kVNomActual")
-                .displayedName("kV Nom=Actual")
-                .description("kV Nom=Actual: OK | NOT OK")
-                .readOnly()
-                .commit(),         
-                
-        STRING_ELEMENT(expected).key("shutterStatus")
-                .displayedName("Shutter Status")
-                .description("Shutter Status: OK | NOT OK")
-                .readOnly()
-                .commit(),                      
-        
-        # Status Word 2
-        STRING_ELEMENT(expected).key("timer1")
-                .displayedName("Timer 1")
-                .description("Timer 1: ON | OFF")
-                .readOnly()
-                .commit(),
-          
-        STRING_ELEMENT(expected).key("timer2")
-                .displayedName("Timer 2")
-                .description("Timer 2: ON | OFF")
-                .readOnly()
-                .commit(),        
-        
-        STRING_ELEMENT(expected).key("timer3")
-                .displayedName("Timer 3")
-                .description("Timer 3: ON | OFF")
-                .readOnly()
-                .commit(),
-                
-        STRING_ELEMENT(expected).key("timer4")
-                .displayedName("Timer 4")
-                .description("Timer 4: ON | OFF")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutterControl1")
-                .displayedName("Shutter Control 1")
-                .description("Shutter Control 1: MANUAL | COMPUTER")
-                .readOnly()
-                .commit(),
-                
-        STRING_ELEMENT(expected).key("shutterControl2")
-                .displayedName("Shutter Control 2")
-                .description("Shutter Control 2: MANUAL | COMPUTER")
-                .readOnly()
-                .commit(),
-                
-        STRING_ELEMENT(expected).key("shutterControl3")
-                .displayedName("Shutter Control 3")
-                .description("Shutter Control 3: MANUAL | COMPUTER")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutterControl4")
-                .displayedName("Shutter Control 4")
-                .description("Shutter Control 4: MANUAL | COMPUTER")
-                .readOnly()
-                .commit(),
-        
-        # Status Word 3
-        STRING_ELEMENT(expected).key("shutter1Command")
-                .displayedName("Shutter 1 Command")
-                .description("Shutter 1 Command: OPEN | CLOSED")
-                .readOnly()
-                .commit(),
-        
-        STRING_ELEMENT(expected).key("shutter1Status")
-                .displayedName("Shutter 1 Status")
-                .description("Shutter 1 Status: OPEN | CLOSED")
-                .readOnly()
-                .commit(),  
-        
-        STRING_ELEMENT(expected).key("shutter1NonSysClosed")
-                .displayedName("Shutter 1 Non-Systematically Closed")
-                .description("Shutter 1 Non-Systematically Closed: YES | NO")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutter1Connected")
-                .displayedName("Shutter 1 Connected")
-                .description("Shutter 1 Connected: YES | NO")
-                .readOnly()
-                .commit(),  
-                
-        STRING_ELEMENT(expected).key("shutter2Command")
-                .displayedName("Shutter 2 Command")
-                .description("Shutter 2 Command: OPEN | CLOSED")
-                .readOnly()
-                .commit(),
-        
-        STRING_ELEMENT(expected).key("shutter2Status")
-                .displayedName("Shutter 2 Status")
-                .description("Shutter 2 Status: OPEN | CLOSED")
-                .readOnly()
-                .commit(),  
-        
-        STRING_ELEMENT(expected).key("shutter2NonSysClosed")
-                .displayedName("Shutter 2 Non-Systematically Closed")
-                .description("Shutter 2 Non-Systematically Closed: YES | NO")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutter2Connected")
-                .displayedName("Shutter 2 Connected")
-                .description("Shutter 2 Connected: YES | NO")
-                .readOnly()
-                .commit(),        
-        
-        # Status Word 4
-        STRING_ELEMENT(expected).key("shutter3Command")
-                .displayedName("Shutter 3 Command")
-                .description("Shutter 3 Command: OPEN | CLOSED")
-                .readOnly()
-                .commit(),
-        
-        STRING_ELEMENT(expected).key("shutter3Status")
-                .displayedName("Shutter 3 Status")
-                .description("Shutter 3 Status: OPEN | CLOSED")
-                .readOnly()
-                .commit(),  
-        
-        STRING_ELEMENT(expected).key("shutter3NonSysClosed")
-                .displayedName("Shutter 3 Non-Systematically Closed")
-                .description("Shutter 3 Non-Systematically Closed: YES | NO")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutter3Connected")
-                .displayedName("Shutter 3 Connected")
-                .description("Shutter 3 Connected: YES | NO")
-                .readOnly()
-                .commit(),  
-                
-        STRING_ELEMENT(expected).key("shutter4Command")
-                .displayedName("Shutter 4 Command")
-                .description("Shutter 4 Command: OPEN | CLOSED")
-                .readOnly()
-                .commit(),
-        
-        STRING_ELEMENT(expected).key("shutter4Status")
-                .displayedName("Shutter 4 Status")
-                .description("Shutter 4 Status: OPEN | CLOSED")
-                .readOnly()
-                .commit(),  
-        
-        STRING_ELEMENT(expected).key("shutter4NonSysClosed")
-                .displayedName("Shutter 4 Non-Systematically Closed")
-                .description("Shutter 4 Non-Systematically Closed: YES | NO")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("shutter4Connected")
-                .displayedName("Shutter 4 Connected")
-                .description("Shutter 4 Connected: YES | NO")
-                .readOnly()
-                .commit(),
-        
-        # Status Word 6
-        STRING_ELEMENT(expected).key("warmupProgram")
-                .displayedName("Warm-Up Program")
-                .description("Warm-Up Program: ACTIVE | NOT ACTIVE")
-                .readOnly()
-                .commit(),
-                
-        STRING_ELEMENT(expected).key("warmupAborted")
-                .displayedName("Warm-Up Aborted")
-                .description("Warm-Up Program: YES | NO")
-                .readOnly()
-                .commit(), 
-                
-        STRING_ELEMENT(expected).key("warmupExtComputer")
-                .displayedName("Warm-Up via External Computer")
-                .description("Warm-Up via External Computer: YES | NO")
-                .readOnly()
-                .commit(),  
-        
-        STRING_ELEMENT(expected).key("warmupKeyboard")
-                .displayedName("Warm-Up via Keyboard")
-                .description("Warm-Up via Keyboard: YES | NO")
-                .readOnly()
-                .commit(),        
+        )
+        GeSeifertXray.statusBitElements(expected)
+        (
         
         # Warm-up program
         NODE_ELEMENT(expected).key("warmup")
@@ -710,7 +1128,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),
                 
         INT32_ELEMENT(expected).key("warmup.timeleft")
-                .tags("scpi poll")
+                .tags("poll slow")
                 .alias(";;WT;*{warmup.timeleft:d};") 
                 .displayedName("Warm-up time left")
                 .description("Warm-up time left")  
@@ -738,7 +1156,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),        
                 
         STRING_ELEMENT(expected).key("focus.string")
-                .tags("scpi poll")
+                .tags("poll static")
                 .alias(";;FR;*{focus.string};") 
                 .displayedName("Focus settings")
                 .description("Focus settings string.")                  
@@ -750,7 +1168,7 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),        
                 
         STRING_ELEMENT(expected).key("anode.material")
-                .tags("scpi poll")
+                .tags("poll static")
                 .alias(";;MR;*{anode.material};") 
                 .displayedName("Anode material type")
                 .description("Anode material string.")                  
@@ -792,6 +1210,462 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
                 .commit(),        
         
         )
+        GeSeifertXray.schemaBuildTime = time.perf_counter() - start
+    
+    @staticmethod
+    def statusWordElements(expected):
+        for wordKey, displayedName, tier, alias, binKey, layout in STATUS_WORD_SCHEMA[0]:
+            (
+            INT32_ELEMENT(expected).key(wordKey)
+                    .tags("poll " + tier)
+                    .alias(alias)
+                    .displayedName(displayedName)
+                    .description(displayedName + " decimal value.")
+                    .readOnly()
+                    .commit(),
+            
+            STRING_ELEMENT(expected).key(binKey)
+                    .displayedName(displayedName + " binary")
+                    .description(layout)
+                    .readOnly()
+                    .commit(),
+            )
+    
+    @staticmethod
+    def statusBitElements(expected):
+        for key, displayedName, description in STATUS_WORD_SCHEMA[1]:
+            (
+            STRING_ELEMENT(expected).key(key)
+                    .displayedName(displayedName)
+                    .description(description)
+                    .readOnly()
+                    .commit(),
+            )
+    
+    def publishChanged(self, derived, taken=None):
+        ''' Publish in one update only the derived values which changed since they were last published.
+        The readbacks of a query marked taken confirm their setpoints. '''
+        if taken is not None:
+            for setpoint, readback in self.CONFIRMING_READBACKS.items():
+                if readback in derived:
+                    self.confirmed.confirm(setpoint, derived[readback], taken)
+        
+        with self.publishLock:
+            h = Hash()
+            for key, value in derived.items():
+                if self.lastPublished.get(key) != value:
+                    h.set(key, value)
+                    self.lastPublished[key] = value
+            
+            if not h.empty():
+                self.set(h)
+    
+    def settleConnection(self):
+        ''' Before queueing a query for the connection, wait for the late replies of a timed out one '''
+        if self.connection is not None:
+            self.connection.settle()
+    
+    def openConnection(self):
+        ''' Return the connection to use for polling and commands '''
+        if self.get("transport") == "asyncio":
+            if self.asyncTransport is None:
+                self.createAsyncTransport().open()
+            self.connection = self.asyncTransport
+        else:
+            self.socketConnection.attach(self.socket)
+            self.connection = self.socketConnection
+        return self.connection
+    
+    def createAsyncTransport(self):
+        ''' Create the asyncio transport, not connected yet '''
+        # The base class socket is not needed anymore
+        if self.socket is not None:
+            self.socket.close()
+        self.asyncTransport = SeifertXrayAsyncTransport(self.get("hostname"), self.get("port"),
+                                                        self.commandTerminator, self.socketTimeout,
+                                                        keepAlive=self.get("tcpKeepAlive"))
+        self.asyncTransport.recorder = self.recorder
+        self.connection = self.asyncTransport
+        return self.asyncTransport
+    
+    def updateCapture(self):
+        ''' Start or stop capturing the traffic when captureFile was changed '''
+        path = self.get("captureFile")
+        if path == (self.recorder.path if self.recorder is not None else ""):
+            return
+        recorder, self.recorder = self.recorder, None
+        if path:
+            try:
+                self.recorder = TrafficRecorder(path, self.commandTerminator)
+                self.log.INFO("Capturing the traffic to {}".format(path))
+            except (IOError, OSError) as e:
+                self.log.ERROR("Cannot capture to {}: {}".format(path, e))
+                self.set("captureFile", "")
+        self.socketConnection.recorder = self.recorder
+        if self.asyncTransport is not None:
+            self.asyncTransport.recorder = self.recorder
+        if recorder is not None:
+            recorder.close()
+    
+    def preDestruction(self):
+        self.stopping = True
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.scheduler is not None:
+            self.scheduler.unregister(self)
+            self.scheduler.unregister((self, "interlock"))
+        if self.asyncTransport is not None:
+            self.asyncTransport.close()
+        super(GeSeifertXray, self).preDestruction()
+    
+    def setHealth(self, health):
+        if self.get("connectionHealth") != health:
+            self.set("connectionHealth", health)
+    
+    def connectionLost(self, error):
+        ''' Start reconnecting in the background, unless already doing so '''
+        with self.reconnectLock:
+            if self.reconnecting or self.stopping:
+                return
+            self.reconnecting = True
+        self.log.WARN("Connection to the generator lost ({}), reconnecting".format(error))
+        self.setHealth("RECONNECTING")
+        thread = threading.Thread(target=self.reconnect)
+        thread.daemon = True
+        thread.start()
+    
+    def reconnect(self):
+        ''' Reconnect with exponential backoff, then restore setpoints and refresh all parameters '''
+        backoff = ReconnectBackoff(self.get("reconnectDelay"), self.get("reconnectDelayMax"))
+        while not self.stopping:
+            time.sleep(backoff.nextDelay())
+            try:
+                with self.ioLock.hold(SETPOINT):
+                    self.reopenConnection()
+                    self.restoreSession()
+                break
+            except Exception as e:
+                self.log.DEBUG("Reconnection failed: {}".format(e))
+        
+        # Everything is published again after the next poll cycle
+        self.staticPolled = False
+        self.nextSlowPoll = 0.
+        with self.publishLock:
+            self.lastPublished.clear()
+        self.reconnecting = False
+        if not self.stopping:
+            self.log.INFO("Reconnected to the generator")
+            self.setHealth("CONNECTED")
+    
+    def reopenConnection(self):
+        ''' Replace the connection in use by a new one '''
+        if self.get("transport") == "asyncio":
+            if self.asyncTransport is not None:
+                self.asyncTransport.close()
+                self.asyncTransport = None
+        else:
+            if self.socket is not None:
+                self.socket.close()
+            self.socket = openSocket(self.get("hostname"), self.get("port"), self.socketTimeout)
+        self.openConnection()
+    
+    def restoreSession(self):
+        ''' Send all configured setpoints again in a single write '''
+        self.compileAliases()
+        self.confirmed.clear()
+        self.connection.send(b"".join(self.aliasPlans[key].writeBytes(self.get)
+                                      for key in self.RESTORED_SETPOINTS))
+    
+    def sendCommand(self, command, value=None):
+        ''' Send a command, setpoints with a ramp rate are ramped in the background '''
+        if command == "off":
+            # High voltage off first, then stop the ramp without waiting for its step in progress
+            try:
+                return self.writeCommand(command, value)
+            finally:
+                self.rampCancelled.set()
+        if command in self.RAMPS and self.get(self.RAMPS[command][2]) > 0:
+            self.startRamp({command: self.get(command) if value is None else value})
+            return None
+        return self.writeCommand(command, value)
+    
+    def writeCommand(self, command, value=None):
+        ''' Write a command, never in the middle of a poll query, and schedule its readback '''
+        if self.reconnecting:
+            raise socket.error("Not connected to the generator, reconnecting")
+        if self.isRedundantWrite(command, value):
+            self.suppressedWrites += 1
+            self.set("suppressedWrites", self.suppressedWrites)
+            self.log.DEBUG("{} already confirmed by the generator, not sent".format(command))
+            return None
+        
+        self.compileAliases()
+        plan = self.aliasPlans.get(command)
+        level = SAFETY if command in self.SAFETY_COMMANDS else SETPOINT
+        # Not confirmed anymore until read back by a query sent after this write
+        self.confirmed.written(command)
+        try:
+            if plan is None or plan.writeParts is None:
+                with self.ioLock.hold(level):
+                    reply = super(GeSeifertXray, self).sendCommand(command, value)
+            else:
+                getValue = lambda key: value if key == command and value is not None else self.get(key)
+                data = plan.writeBytes(getValue)
+                reply = None
+                # Including the wait for the connection, the latency of a safety command is bounded
+                # by one exchange, the longest query or a pipelined batch, and a short quiet window
+                # dropping late replies: the wait for them is done outside ioLock, see settleConnection
+                start = time.perf_counter()
+                if self.get("transport") == "asyncio":
+                    # A write gets no reply, it goes out at once, not after the exchange in progress
+                    self.openConnection().send(data)
+                else:
+                    with self.ioLock.hold(level):
+                        self.openConnection().send(data)
+                self.latency.record(plan.writeMnemonic, time.perf_counter() - start)
+        except Exception as e:
+            if isConnectionError(e):
+                self.connectionLost(e)
+            raise
+        
+        if command in self.READBACKS:
+            readback = threading.Timer(self.get("readbackDelay"), self.readBack, (self.READBACKS[command],))
+            readback.daemon = True
+            readback.start()
+        return reply
+    
+    def startRamp(self, targets):
+        ''' Ramp the setpoints to the {setpoint: value} targets in the background '''
+        self.cancelRamp()
+        self.rampCancelled = threading.Event()
+        self.rampThread = threading.Thread(target=self.runRamp, args=(targets, self.rampCancelled))
+        self.rampThread.daemon = True
+        self.rampThread.start()
+    
+    def runRamp(self, targets, cancelled):
+        ''' Step the setpoints towards targets, each at its rate, checking every step '''
+        positions = dict((key, self.get(self.RAMPS[key][0])) for key in targets)
+        distance = sum(abs(targets[key] - positions[key]) for key in targets) or 1
+        nextStep = dict((key, time.time()) for key in targets)
+        self.set(Hash("ramp.active", True, "ramp.progress", 0., "ramp.status", "Ramping"))
+        status = "Done"
+        try:
+            while positions != targets:
+                key = min([key for key in targets if positions[key] != targets[key]], key=nextStep.get)
+                if cancelled.wait(max(0., nextStep[key] - time.time())):
+                    status = "Cancelled"
+                    break
+                rate = self.get(self.RAMPS[key][2])
+                if rate > 0:
+                    step = positions[key] + (1 if targets[key] > positions[key] else -1)
+                    nextStep[key] = time.time() + 1. / rate
+                else:
+                    step = targets[key]
+                self.writeCommand(key, step)
+                if not self.waitRampStep(key, step, cancelled):
+                    status = "Cancelled"
+                    break
+                positions[key] = step
+                remaining = sum(abs(targets[key] - positions[key]) for key in targets)
+                self.set("ramp.progress", 100. * (distance - remaining) / distance)
+        except Exception as e:
+            status = "Failed: {}".format(e)
+            self.log.ERROR("Ramp failed: {}".format(e))
+        self.set(Hash("ramp.active", False, "ramp.status", status))
+    
+    def waitRampStep(self, key, step, cancelled):
+        ''' Wait until a ramp step is read back, return False if the ramp was cancelled '''
+        target, actual, rate = self.RAMPS[key]
+        readback = actual if self.get("highVoltageStatus") == "ON" else target
+        deadline = time.time() + self.get("ramp.settleTimeout")
+        while abs(self.get(readback) - step) > self.get("ramp.tolerance"):
+            if time.time() > deadline:
+                raise RuntimeError("{} did not reach {} within {} s".format(readback, step,
+                                                                          self.get("ramp.settleTimeout")))
+            if cancelled.wait(0.05):
+                return False
+        return True
+    
+    def isRedundantWrite(self, command, value):
+        ''' Tell whether the setpoint command would only send the value the generator already has '''
+        if command not in self.CONFIRMING_READBACKS or self.get("forceWrites"):
+            return False
+        if value is None:
+            value = self.get(command)
+        return self.confirmed.holds(command, value, time.time(), self.get("confirmationAge"))
+    
+    def readBack(self, keys):
+        ''' Query and publish the given polled parameters out of the poll cycle '''
+        self.compileAliases()
+        plans = [self.aliasPlans[key] for key in keys]
+        taken = self.confirmed.taken(time.time())
+        try:
+            raw = self.querySequential(plans)
+        except Exception as e:
+            # The next poll cycle will bring the values anyway
+            self.log.WARN("Readback of {} failed: {}".format(", ".join(keys), e))
+            if isConnectionError(e):
+                self.connectionLost(e)
+            return
+        self.checkInterlock(raw)
+        derived = deriveValues(raw)
+        self.followCountdown(raw, derived)
+        self.publishChanged(derived, taken)
+    
+    def compileAliases(self):
+        ''' Compile the aliases of the class into plans, only done by its first instance '''
+        cls = type(self)
+        if cls.aliasPlans is not None:
+            return
+        schema = self.getFullSchema()
+        aliasPlans = {}
+        pollTiers = {"fast": [], "slow": [], "static": []}
+        for key in schema.getPaths():
+            if not schema.keyHasAlias(key):
+                continue
+            plan = aliasPlans[key] = AliasPlan(key, schema.getAliasAsString(key), self.commandTerminator)
+            tags = schema.getTags(key) if schema.hasTags(key) else []
+            if "poll" in tags:
+                tier = [tag for tag in tags if tag in pollTiers][0]
+                pollTiers[tier].append(plan)
+        cls.pollTiers = pollTiers
+        cls.aliasPlans = aliasPlans
+    
+    def pollDueParameters(self, cycle=None):
+        ''' Query the polled parameters which are due in this cycle, profiled into cycle '''
+        if self.reconnecting:
+            return {}
+        
+        self.updateCapture()
+        start = time.perf_counter_ns()
+        due = self.duePlans()
+        if cycle is not None:
+            cycle.append(("schedule", start, time.perf_counter_ns()))
+        try:
+            if self.get("pipelinedPolling"):
+                raw = self.queryPipelined(due, cycle)
+            else:
+                raw = self.querySequential(due, cycle)
+        except Exception as e:
+            # Read everything again once the communication works
+            self.staticPolled = False
+            self.nextSlowPoll = 0.
+            if isConnectionError(e):
+                self.connectionLost(e)
+                return {}
+            raise
+        self.staticPolled = True
+        self.setHealth("CONNECTED")
+        return raw
+    
+    def duePlans(self):
+        ''' Return the plans of the polled parameters which are due in this cycle '''
+        self.compileAliases()
+        due = list(self.pollTiers["fast"])
+        if not self.staticPolled:
+            due += self.pollTiers["static"]
+        now = time.time()
+        if now >= self.nextSlowPoll:
+            due += self.pollTiers["slow"]
+            self.nextSlowPoll = now + self.get("slowPollPeriod")
+        if self.get("countdown.enabled") and not self.countdown.syncDue(now, self.get("countdown.resyncPeriod")):
+            # Predicted by the countdown thread
+            due = [plan for plan in due if plan.key != "exposuretimerActual.totalSec"]
+        if self.interlockWatched():
+            due = [plan for plan in due if plan.key not in self.INTERLOCK_KEYS]
+        return due
+    
+    async def pollCycleAsync(self):
+        ''' Poll cycle run by the shared scheduler: query on its event loop, publish in its worker pool '''
+        if self.reconnecting:
+            return
+        self.updateCapture()
+        cycle = self.profiler.begin()
+        start = time.perf_counter_ns()
+        due = self.duePlans()
+        try:
+            if self.asyncTransport is None:
+                await self.createAsyncTransport().connectAsync()
+            # Not ioLock, which would block the event loop: the transport serializes the
+            # exchanges of this device, the interlock watch and readbacks wait for this one
+            sent = time.perf_counter_ns()
+            taken = self.confirmed.taken(time.time())
+            try:
+                frames = await self.asyncTransport.exchangeAsync(b"".join([plan.queryBytes for plan in due]),
+                                                                 len(due), self.get("pipelineTimeout"))
+            except socket.timeout:
+                self.latency.timeout("pipeline")
+                raise
+            received = time.perf_counter_ns()
+            self.latency.record("pipeline", (received - sent) * 1e-9)
+            raw = dict((plan.key, plan.parse(frame)) for plan, frame in zip(due, frames))
+            if cycle is not None:
+                cycle.extend((("schedule", start, sent), ("io", sent, received),
+                              ("parse", received, time.perf_counter_ns())))
+        except Exception as e:
+            self.staticPolled = False
+            self.nextSlowPoll = 0.
+            if isConnectionError(e):
+                self.connectionLost(e)
+                return
+            raise
+        self.staticPolled = True
+        self.setHealth("CONNECTED")
+        
+        job = self.scheduler.submit(self, self.publishPolled, raw, cycle, taken)
+        if job is None:
+            self.log.WARN("Still publishing the previous poll cycle, values dropped")
+            return
+        await job
+    
+    def querySequential(self, plans, cycle=None):
+        ''' Query the parameters of the plans one by one, commands may go in between '''
+        raw = {}
+        for plan in plans:
+            self.settleConnection()
+            with self.ioLock.hold(POLL):
+                start = time.perf_counter_ns()
+                try:
+                    frame = self.openConnection().exchange(plan.queryBytes, 1)[0]
+                except socket.timeout:
+                    self.latency.timeout(plan.query)
+                    raise
+                received = time.perf_counter_ns()
+                self.latency.record(plan.query, (received - start) * 1e-9)
+                raw[plan.key] = plan.parse(frame)
+            if cycle is not None:
+                cycle.extend((("io", start, received), ("parse", received, time.perf_counter_ns())))
+        return raw
+    
+    def queryPipelined(self, plans, cycle=None):
+        ''' Query the parameters of the plans in one batch '''
+        self.settleConnection()
+        with self.ioLock.hold(POLL):
+            try:
+                start = time.perf_counter_ns()
+                try:
+                    frames = self.openConnection().exchange(b"".join([plan.queryBytes for plan in plans]),
+                                                            len(plans), self.get("pipelineTimeout"))
+                except socket.timeout:
+                    self.latency.timeout("pipeline")
+                    raise
+                received = time.perf_counter_ns()
+                self.latency.record("pipeline", (received - start) * 1e-9)
+                raw = {}
+                for plan, frame in zip(plans, frames):
+                    raw[plan.key] = plan.parse(frame)
+                if cycle is not None:
+                    cycle.extend((("io", start, received), ("parse", received, time.perf_counter_ns())))
+                return raw
+            except (socket.timeout, ValueError) as e:
+                # A reply was lost or does not match its position: the
+                # remaining replies cannot be trusted, start over one by one
+                self.log.WARN("Pipelined poll failed ({}), resynchronising".format(e))
+                if not isinstance(e, socket.timeout):
+                    # After a timeout the next exchange resyncs, once settled
+                    self.connection.resync()
+        return self.querySequential(plans, cycle)
+    
     """   
     def followHardwareState(self):
         
@@ -807,279 +1681,216 @@ class GeSeifertXray(ScpiDevice2, ScpiOnOffFsm):
     """
     ### Override base class post-processing method pollInstrumentSpecific ###
     def pollInstrumentSpecific(self): 
-
-
-       '''Status Word 12 messages'''
-       statusWord12Msg = {
-       0:'No messages',
-       33:'Cooling system failed',
-       37:'Absolute undervoltage monitoring',
-       38:'Absolute overvoltage monitoring',
-       39:'Absolute undercurrent monitoring',
-       43:'Extern stop',
-       46:'EMERGENCY-STOP',
-       49:'Preselection exceeded rated power',
-       50:'Tube overpower',
-       51:'Preselection out of range',
-       52:'Presel.exceeding rated generator current',
-       53:'High voltage lamp defective',
-       55:'Relative overcurrent monitoring',
-       56:'Relative undervoltage monitoring',
-       60:'Relative undercurrent monitoring',
-       63:'Door contact 1 and 2 open',
-       64:'Door contact 1 open',
-       65:'Door contact 2 open',
-       67:'Temp. supervision cooling system',
-       70:'Tube to be warmed up?',
-       72:'Preselection out of range',
-       76:'----Stand-by----',
-       80:'Temperature supervision power module',
-       86:'HV contact faulty',
-       90:'Fault in filament circuit',
-       91:'Buffer battery empty',
-       96:'Shutter non-systematically closed',
-       97:'Shutter not connected',
-       98:'Shutter not opened',
-       99:'Shutter not closed',
-       104:'External warning lamp failed',
-       105:'Temperature supervision generator',
-       106:'Warm-up necessary',
-       108:'Power fail (low voltage)',
-       109:'Warm-up! 0=No',
-       112:'Shutter safety circuit open',
-       113:'Absolute overcurrent monitoring',
-       114:'Relative overvoltage monitoring',
-       116:'Warm-up terminated after 3 attempts',
-       117:'Warm-up aborted. Try again',
-       118:'Push START button'}
-
-
-       '''Current setpoint is returned in uA, convert to mA'''
-       targetInmA = self.get("current.target") // 1000
-       self.set("current.target",targetInmA)
-       #To avoid flickering of the actual value from uA<->mA we store the mA value in another parameter
-       actualInmA = self.get("current.actual") // 1000
-       self.set("current.actual_milli",actualInmA)
-
-       '''Voltage setpoint returned in Volt, convert to kV'''
-       targetInKV = self.get("voltage.target") // 1000
-       self.set("voltage.target",targetInKV)
-       #To avoid flickering of the actual value from Volts<->Kilovolts we store the Kilovolts value in another parameter
-       actualInKV = self.get("voltage.actual") // 1000
-       self.set("voltage.actual_kilo",actualInKV)       
-       
-       '''Exposure timer actual value returned in sec., convert to hh,mm,ss'''
-       mm, ss = divmod(self.get("exposuretimerActual.totalSec"),60)
-       hh, mm = divmod(mm, 60)
-       self.set("exposuretimerActual.hours",hh)
-       self.set("exposuretimerActual.minutes",mm)
-       self.set("exposuretimerActual.seconds",ss)
-
-       
-       '''Process Status Words'''
-       sw1 = self.get("sw.statusWord1") #this is integer
-       sw1Bin = "{0:08b}".format(sw1) #this is string
-       self.set("sw.statusWord1Bin",sw1Bin)
        
-       if (sw1 & 128):
-           self.set("extComputerControl","ON")
-       else:
-           self.set("extComputerControl","OFF")
-           
-       if (sw1 & 64):
-           self.set("highVoltageStatus","ON")
-       else:
-           self.set("highVoltageStatus","OFF")
-           
-       if (sw1 & 32): 
-           self.set("coolingCircuit","NOT OK")
-       else:
-           self.set("coolingCircuit","OK")  
-           
-       if (sw1 & 16): 
-           self.set("bufferBattery","EMPTY")
-       else:
-           self.set("bufferBattery","OK")
-           
-       if (sw1 & 8): 
-           self.set("mANomActual","NOT OK")
-       else:
-           self.set("mANomActual","OK")  
-           
-       if (sw1 & 4): 
-           self.set("kVNomActual","NOT OK")
-       else:
-           self.set("kVNomActual","OK")
-           
-       if (sw1 & 2): 
-           self.set("shutterStatus","NOT OK")
-       else:
-           self.set("shutterStatus","OK")
-
-       sw2 = self.get("sw.statusWord2")
-       sw2Bin = "{0:08b}".format(sw2)
-       self.set("sw.statusWord2Bin",sw2Bin)
-
-       if (sw2 & 128):
-           self.set("timer1","ON")
-       else:
-           self.set("timer1","OFF")
-           
-       if (sw2 & 64):
-           self.set("timer2","ON")
-       else:
-           self.set("timer2","OFF")
-           
-       if (sw2 & 32): 
-           self.set("timer3","ON")
-       else:
-           self.set("timer3","OFF")  
-           
-       if (sw2 & 16): 
-           self.set("timer4","ON")
-       else:
-           self.set("timer4","OFF")
-           
-       if (sw2 & 8): 
-           self.set("shutterControl1","COMPUTER")
-       else:
-           self.set("shutterControl1","MANUAL")  
-           
-       if (sw2 & 4): 
-           self.set("shutterControl2","COMPUTER")
-       else:
-           self.set("shutterControl2","MANUAL")
-           
-       if (sw2 & 2): 
-           self.set("shutterControl3","COMPUTER")
-       else:
-           self.set("shutterControl3","MANUAL")
-           
-       if (sw2 & 1): 
-           self.set("shutterControl4","COMPUTER")
-       else:
-           self.set("shutterControl4","MANUAL")    
-
-       sw3 = self.get("sw.statusWord3")
-       sw3Bin = "{0:08b}".format(sw3)
-       self.set("sw.statusWord3Bin",sw3Bin)
-
-       if (sw3 & 128):
-           self.set("shutter1Command","OPEN")
-       else:
-           self.set("shutter1Command","CLOSED")
-           
-       if (sw3 & 64):
-           self.set("shutter1Status","OPEN")
-       else:
-           self.set("shutter1Status","CLOSED")
-           
-       if (sw3 & 32): 
-           self.set("shutter1NonSysClosed","YES")
-       else:
-           self.set("shutter1NonSysClosed","NO")  
-           
-       if (sw3 & 16): 
-           self.set("shutter1Connected","NO")
-       else:
-           self.set("shutter1Connected","YES")
-           
-       if (sw3 & 8): 
-           self.set("shutter2Command","OPEN")
-       else:
-           self.set("shutter2Command","CLOSED")  
-           
-       if (sw3 & 4): 
-           self.set("shutter2Status","OPEN")
-       else:
-           self.set("shutter2Status","CLOSED")
-           
-       if (sw3 & 2): 
-           self.set("shutter2NonSysClosed","YES")
-       else:
-           self.set("shutter2NonSysClosed","NO")
-           
-       if (sw3 & 1): 
-           self.set("shutter2Connected","NO")
-       else:
-           self.set("shutter2Connected","YES")
-       
-       sw4 = self.get("sw.statusWord4")
-       sw4Bin = "{0:08b}".format(sw4)
-       self.set("sw.statusWord4Bin",sw4Bin)
-       
-       if (sw4 & 128):
-           self.set("shutter3Command","OPEN")
-       else:
-           self.set("shutter3Command","CLOSED")
-           
-       if (sw4 & 64):
-           self.set("shutter3Status","OPEN")
-           self.set("beamshutter.status","Open") # because ot was already used
-       else:
-           self.set("shutter3Status","CLOSED")
-           self.set("beamshutter.status","Closed") # because ot was already used
-           
-       if (sw4 & 32): 
-           self.set("shutter3NonSysClosed","YES")
-       else:
-           self.set("shutter3NonSysClosed","NO")  
-           
-       if (sw4 & 16): 
-           self.set("shutter3Connected","NO")
-       else:
-           self.set("shutter3Connected","YES")
-           
-       if (sw4 & 8): 
-           self.set("shutter4Command","OPEN")
-       else:
-           self.set("shutter4Command","CLOSED")  
-           
-       if (sw4 & 4): 
-           self.set("shutter4Status","OPEN")
-       else:
-           self.set("shutter4Status","CLOSED")
-           
-       if (sw4 & 2): 
-           self.set("shutter4NonSysClosed","YES")
-       else:
-           self.set("shutter4NonSysClosed","NO")
-           
-       if (sw4 & 1): 
-           self.set("shutter4Connected","NO")
-       else:
-           self.set("shutter4Connected","YES")
-                                   
-       sw6 = self.get("sw.statusWord6")
-       sw6Bin = "{0:08b}".format(sw6)
-       self.set("sw.statusWord6Bin",sw6Bin)
-       
-       if (sw6 & 8): 
-           self.set("warmupProgram","ACTIVE")
-       else:
-           self.set("warmupProgram","NOT ACTIVE")  
-           
-       if (sw6 & 4): 
-           self.set("warmupAborted","YES")
-       else:
-           self.set("warmupAborted","NO")
-           
-       if (sw6 & 2): 
-           self.set("warmupExtComputer","YES")
-       else:
-           self.set("warmupExtComputer","NO")
-           
-       if (sw6 & 1): 
-           self.set("warmupKeyboard","YES")
-       else:
-           self.set("warmupKeyboard","NO")
+        if self.scheduler is not None:
+            # Polled by the shared scheduler, see pollCycleAsync
+            return
+        cycle = self.profiler.begin()
+        taken = self.confirmed.taken(time.time())
+        self.publishPolled(self.pollDueParameters(cycle), cycle, taken)
+    
+    def publishPolled(self, raw, cycle=None, taken=None):
+        ''' Publish the values of a poll cycle together with the values derived from them,
+        taken marks when its queries were sent '''
+        self.pollCycle += 1
+        fullRefreshCycles = self.get("fullRefreshCycles")
+        if fullRefreshCycles > 0 and self.pollCycle >= fullRefreshCycles:
+            self.pollCycle = 0
+            with self.publishLock:
+                self.lastPublished.clear()
        
-       ### Display Status Word 12 message ###
-       msgIdx = self.get("statusMassage.statusWord12")
-       msgTxt = statusWord12Msg[msgIdx]
-       self.set("statusMassage.statusWord12Str",msgTxt)
-                     
+        self.checkInterlock(raw)
+        self.startInterlockWatch()
+        start = time.perf_counter_ns()
+        derived = deriveValues(raw)
+        self.followCountdown(raw, derived)
+        derivedTime = time.perf_counter_ns()
+        self.recordHistory(raw, derived)
+        historyTime = time.perf_counter_ns()
+        self.publishChanged(derived, taken)
+        if not self.startupPublished:
+            self.publishStartup()
+        if cycle is not None:
+            cycle.extend((("derive", start, derivedTime), ("history", derivedTime, historyTime),
+                          ("publish", historyTime, time.perf_counter_ns())))
+            self.profiler.end(cycle)
+        self.publishStatistics()
+    
+    def publishStartup(self):
+        ''' Publish how long the schema and the first poll cycle took '''
+        self.startupPublished = True
+        firstPoll = time.time() - processStartTime()
+        self.set("startup.firstPoll", firstPoll)
+        if GeSeifertXray.schemaBuildTime is not None:
+            self.set("startup.schemaBuild", 1e3 * GeSeifertXray.schemaBuildTime)
+        self.log.INFO("First poll cycle published {:.3f} s after the process start".format(firstPoll))
+    
+    def publishStatistics(self):
+        ''' Publish the latency and profiler statistics and write their files every latency.publishPeriod '''
+        now = time.time()
+        if now < self.nextStatisticsPublish:
+            return
+        self.nextStatisticsPublish = now + self.get("latency.publishPeriod")
+        commands, p50, p95, p99, maximum, timeouts = self.latency.summary()
+        h = Hash("latency.commands", commands, "latency.p50", p50, "latency.p95", p95,
+                 "latency.p99", p99, "latency.max", maximum, "latency.timeouts", timeouts,
+                 "latency.garbageBytes", self.socketConnection.framer.discarded)
+        levels, depth, maxDepth, waitP99, waitMax = self.ioLock.statistics()
+        h.set("commandQueue.levels", levels)
+        h.set("commandQueue.depth", depth)
+        h.set("commandQueue.maxDepth", maxDepth)
+        h.set("commandQueue.waitP99", waitP99)
+        h.set("commandQueue.waitMax", waitMax)
+        if self.profiler.enabled:
+            phases, mean, maximum = self.profiler.statistics()
+            h.set("profiler.phases", phases)
+            h.set("profiler.mean", mean)
+            h.set("profiler.max", maximum)
+        self.set(h)
        
+        for path, metrics in ((self.get("latency.file"), self.latency),
+                              (self.get("profiler.traceFile") if self.profiler.enabled else "", self.profiler)):
+            if path:
+                try:
+                    metrics.dump(path, self.get("deviceId"))
+                except (IOError, OSError) as e:
+                    self.log.WARN("Cannot write {}: {}".format(path, e))
+    
+    def followCountdown(self, raw, derived):
+        ''' Sync the exposure timer countdown with the polled values and start predicting when it runs '''
+        if not self.get("countdown.enabled"):
+            # Polled every cycle, nothing to sync
+            return
+        now = time.time()
+        if "sw.statusWord2" in raw:
+            # Started or stopped: the next poll cycle measures the actual value
+            self.countdown.setRunning(bool(raw["sw.statusWord2"] & 32))
+        if "exposuretimerActual.totalSec" in raw:
+            # Only queried to resync, see duePlans. The drift is known when the timer
+            # was running since the last sync, and only changes at a resync.
+            drift = self.countdown.sync(raw["exposuretimerActual.totalSec"], now)
+            if drift is not None:
+                derived["countdown.drift"] = drift
+        
+        if (self.countdown.running and self.countdown.syncTime is not None
+                and (self.countdownThread is None or not self.countdownThread.is_alive())):
+            self.countdownThread = threading.Thread(target=self.runCountdown)
+            self.countdownThread.daemon = True
+            self.countdownThread.start()
+    
+    def runCountdown(self):
+        ''' Publish the predicted exposure timer value at the display rate while the timer runs '''
+        while self.get("countdown.enabled") and self.countdown.running and not self.stopping:
+            if self.countdown.syncTime is not None:
+                derived = {}
+                deriveExposureTimer(self.countdown.predict(time.time()), derived)
+                self.publishChanged(derived)
+            time.sleep(1. / self.get("countdown.displayRate"))
+    
+    def startInterlockWatch(self):
+        ''' Start the interlock watch thread when interlock.enabled, unless it runs already.
+        With the shared scheduler the watch is a coroutine registered in __init__ instead. '''
+        if (self.get("interlock.enabled") and not self.stopping and self.scheduler is None
+                and (self.interlockThread is None or not self.interlockThread.is_alive())):
+            self.interlockThread = threading.Thread(target=self.runInterlockWatch)
+            self.interlockThread.daemon = True
+            self.interlockThread.start()
+    
+    def interlockWatched(self):
+        ''' Tell whether the interlock status words are queried by the interlock watch, not by the poll cycle '''
+        if self.scheduler is not None:
+            return self.get("interlock.enabled")
+        return self.interlockThread is not None and self.interlockThread.is_alive()
+    
+    def interlockQuery(self):
+        ''' Return the plans of the interlock status words and their queries in one batch '''
+        self.compileAliases()
+        plans = [self.aliasPlans[key] for key in self.INTERLOCK_KEYS]
+        return plans, b"".join(plan.queryBytes for plan in plans)
+    
+    def runInterlockWatch(self):
+        ''' Query the interlock status words every interlock.period and publish them '''
+        plans, data = self.interlockQuery()
+        while self.get("interlock.enabled") and not self.stopping:
+            start = time.time()
+            if not self.reconnecting:
+                try:
+                    raw = self.queryInterlock(plans, data)
+                except Exception as e:
+                    self.log.WARN("Interlock query failed: {}".format(e))
+                    if isConnectionError(e):
+                        self.connectionLost(e)
+                else:
+                    self.publishChanged(deriveValues(raw))
+            time.sleep(max(0., start + self.get("interlock.period") - time.time()))
+    
+    def queryInterlock(self, plans, data):
+        ''' Query the interlock status words in one exchange, before any waiting poll query '''
+        # Serialized like the poll queries with either transport, ahead of them
+        self.settleConnection()
+        with self.ioLock.hold(SAFETY):
+            sent = time.perf_counter()
+            frames = self.openConnection().exchange(data, len(plans))
+            raw = dict((plan.key, plan.parse(frame)) for plan, frame in zip(plans, frames))
+        self.latency.record("interlock", time.perf_counter() - sent)
+        self.checkInterlock(raw, sent)
+        return raw
+    
+    async def watchInterlockAsync(self):
+        ''' Interlock watch run by the shared scheduler: query on its event loop, publish in its worker pool '''
+        if not self.get("interlock.enabled") or self.reconnecting or self.asyncTransport is None:
+            return # Connected by the poll cycle
+        plans, data = self.interlockQuery()
+        sent = time.perf_counter()
+        try:
+            # After the exchange in progress, see SeifertXrayAsyncTransport.exchangeAsync
+            frames = await self.asyncTransport.exchangeAsync(data, len(plans))
+        except Exception as e:
+            if isConnectionError(e):
+                self.connectionLost(e)
+                return
+            raise
+        raw = dict((plan.key, plan.parse(frame)) for plan, frame in zip(plans, frames))
+        self.latency.record("interlock", time.perf_counter() - sent)
+        # On the event loop, not behind the publishing jobs
+        self.checkInterlock(raw, sent)
+        self.scheduler.submit((self, "interlock"), self.publishChanged, deriveValues(raw))
+    
+    def checkInterlock(self, raw, sent=None):
+        ''' Go to the error state when the status words in raw report a critical fault '''
+        if not any(key in raw for key in self.INTERLOCK_KEYS):
+            return
+        fault = interlockFault(raw)
+        with self.interlockLock:
+            if fault is None:
+                # Cleared only once both words report no fault anymore
+                if not self.interlockTripped or not all(key in raw for key in self.INTERLOCK_KEYS):
+                    return
+                self.interlockTripped = False
+            elif self.interlockTripped:
+                return
+            else:
+                self.interlockTripped = True
+        if fault is None:
+            self.set("interlock.tripped", False)
+            self.log.INFO("Interlock fault cleared")
+            return
+        self.set(Hash("interlock.tripped", True, "interlock.fault", fault))
+        self.log.ERROR("Interlock: {}".format(fault))
+        self.errorFound("Interlock: {}".format(fault),
+                        "Status Word 12 code {}, Status Word 1 {}".format(raw.get("statusMassage.statusWord12"),
+                                                                           raw.get("sw.statusWord1")))
+        if sent is not None:
+            self.set("interlock.reactionTime", 1e3 * (time.perf_counter() - sent))
+    
+    def recordHistory(self, raw, derived):
+        ''' Append the polled values to their history and add the statistics to derived '''
+        now = time.time()
+        window = self.get("history.window")
+        for key, statisticsKey in self.HISTORY.items():
+            if key in raw:
+                self.history[key].append(now, raw[key])
+                derived[statisticsKey] = self.history[key].statistics(window, now)
     
 # This entry used by device server
 if __name__ == "__main__":
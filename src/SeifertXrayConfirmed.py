@@ -0,0 +1,48 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Setpoints of the Seifert X-ray generator confirmed by their readback'''
+
+import threading
+
+
+class ConfirmedSetpoints(object):
+    '''Setpoint values read back from the generator after their last write.
+    Every write starts a new generation: a readback queried before it may
+    still hold the old value and is dropped.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0 # Number of setpoint writes so far
+        self.values = {} # Setpoint -> (value, time.time() its query was sent)
+
+    def taken(self, now):
+        ''' Mark a query sent at now, to be passed to confirm with its readback '''
+        with self.lock:
+            return self.generation, now
+
+    def confirm(self, setpoint, value, taken):
+        ''' Store the readback of the setpoint unless a setpoint was written since its query '''
+        generation, queried = taken
+        with self.lock:
+            if generation == self.generation:
+                self.values[setpoint] = (value, queried)
+
+    def written(self, setpoint):
+        ''' Forget the setpoint before it is written and drop the readbacks under way '''
+        with self.lock:
+            self.generation += 1
+            self.values.pop(setpoint, None)
+
+    def clear(self):
+        ''' Forget all setpoints, e.g. after a reconnect '''
+        with self.lock:
+            self.generation += 1
+            self.values.clear()
+
+    def holds(self, setpoint, value, now, maxAge):
+        ''' Tell whether the generator reported value for the setpoint at most maxAge seconds before now '''
+        with self.lock:
+            confirmed = self.values.get(setpoint)
+        return confirmed is not None and confirmed[0] == value and now - confirmed[1] <= maxAge
@@ -0,0 +1,43 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Local prediction of the exposure timer of the Seifert X-ray generator'''
+
+
+class ExposureCountdown(object):
+    '''Remaining time of a running exposure timer, extrapolated from the last
+    value measured on the generator'''
+
+    def __init__(self):
+        self.running = False
+        self.measured = None # Remaining seconds at the last sync
+        self.syncTime = None # time.time() of the last sync, None if a sync is needed
+
+    def setRunning(self, running):
+        ''' Follow the timer state, return True if it changed. A change needs a sync. '''
+        if running == self.running:
+            return False
+        self.running = running
+        self.syncTime = None
+        return True
+
+    def predict(self, now):
+        ''' Return the remaining seconds at now '''
+        if not self.running:
+            return self.measured
+        return max(0, self.measured - int(now - self.syncTime))
+
+    def sync(self, measured, now):
+        ''' Take a measured value, return the drift predicted - measured in seconds,
+        None if there was no prediction to compare with '''
+        drift = None
+        if self.running and self.syncTime is not None:
+            drift = float(self.measured - (now - self.syncTime) - measured)
+        self.measured = measured
+        self.syncTime = now
+        return drift
+
+    def syncDue(self, now, period):
+        ''' Tell whether the timer must be measured, not only predicted '''
+        return not self.running or self.syncTime is None or now - self.syncTime >= period
@@ -0,0 +1,205 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Statistics kept by the GeSeifertXray device about itself and the generator'''
+
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy
+
+IMPORTED = time.time()
+
+
+def processStartTime():
+    ''' Return the time.time() at which this process started, when this module was imported if unknown '''
+    try:
+        with open("/proc/self/stat") as stat:
+            # The command name in parentheses may contain spaces, starttime is field 22
+            ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            # Both count from the boot, btime in /proc/stat is rounded to seconds
+            running = float(uptime.read().split()[0]) - ticks / float(os.sysconf("SC_CLK_TCK"))
+        return time.time() - running
+    except (OSError, ValueError, IndexError):
+        return IMPORTED
+
+
+class RingBuffer(object):
+    '''Fixed capacity history of timestamped values, the oldest are overwritten'''
+
+    def __init__(self, capacity):
+        self.times = numpy.zeros(capacity)
+        self.values = numpy.zeros(capacity)
+        self.capacity = capacity
+        self.count = 0
+        self.next = 0 # Index of the next value
+
+    def append(self, timestamp, value):
+        self.times[self.next] = timestamp
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, seconds, now):
+        ''' Return the values of the last seconds before now, in no particular order '''
+        times = self.times[:self.count]
+        return self.values[:self.count][times >= now - seconds]
+
+    def statistics(self, seconds, now):
+        ''' Return [min, max, mean, standard deviation] of the last seconds, [] if there are no values '''
+        values = self.window(seconds, now)
+        if not values.size:
+            return []
+        return [float(values.min()), float(values.max()), float(values.mean()), float(values.std())]
+
+
+class LatencyHistogram(object):
+    '''Round-trip times counted in buckets growing by a constant factor, from
+    lowest seconds over decades decades'''
+
+    def __init__(self, lowest=1e-4, decades=5, perDecade=10):
+        # Upper bounds of the buckets, slower times are counted in an extra one
+        self.bounds = [lowest * 10 ** (float(index) / perDecade) for index in range(1, decades * perDecade + 1)]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+        self.timeouts = 0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        ''' Return the upper bound of the bucket holding the fraction quantile, 0 if empty '''
+        if not self.count:
+            return 0.
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                break
+        return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+
+
+class LatencyRecorder(object):
+    '''Latency histograms of the commands sent to the generator, by mnemonic'''
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, mnemonic):
+        if mnemonic not in self.histograms:
+            self.histograms[mnemonic] = LatencyHistogram()
+        return self.histograms[mnemonic]
+
+    def record(self, mnemonic, seconds):
+        with self.lock:
+            self.histogram(mnemonic).record(seconds)
+
+    def timeout(self, mnemonic):
+        with self.lock:
+            self.histogram(mnemonic).timeouts += 1
+
+    def summary(self):
+        ''' Return the mnemonics and their p50, p95, p99, max in ms and timeouts, as parallel lists '''
+        with self.lock:
+            mnemonics = sorted(self.histograms)
+            histograms = [self.histograms[mnemonic] for mnemonic in mnemonics]
+            return (mnemonics,
+                    [1e3 * histogram.percentile(0.5) for histogram in histograms],
+                    [1e3 * histogram.percentile(0.95) for histogram in histograms],
+                    [1e3 * histogram.percentile(0.99) for histogram in histograms],
+                    [1e3 * histogram.max for histogram in histograms],
+                    [histogram.timeouts for histogram in histograms])
+
+    def prometheus(self, device):
+        ''' Return the histograms in the Prometheus text exposition format '''
+        lines = ["# HELP seifert_xray_rtt_seconds Round-trip time of the commands sent to the generator",
+                 "# TYPE seifert_xray_rtt_seconds histogram"]
+        timeouts = ["# HELP seifert_xray_timeouts_total Commands without reply within the timeout",
+                    "# TYPE seifert_xray_timeouts_total counter"]
+        with self.lock:
+            for mnemonic in sorted(self.histograms):
+                histogram = self.histograms[mnemonic]
+                labels = 'device="{}",command="{}"'.format(device, mnemonic)
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append('seifert_xray_rtt_seconds_bucket{{{},le="{:.6g}"}} {}'.format(labels, bound, cumulative))
+                lines.append('seifert_xray_rtt_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, histogram.count))
+                lines.append("seifert_xray_rtt_seconds_sum{{{}}} {:.6f}".format(labels, histogram.sum))
+                lines.append("seifert_xray_rtt_seconds_count{{{}}} {}".format(labels, histogram.count))
+                timeouts.append("seifert_xray_timeouts_total{{{}}} {}".format(labels, histogram.timeouts))
+        return "\n".join(lines + timeouts) + "\n"
+
+    def dump(self, path, device):
+        ''' Write the Prometheus text to path, replacing it at once for the readers '''
+        with open(path + ".tmp", "w") as output:
+            output.write(self.prometheus(device))
+        os.replace(path + ".tmp", path)
+
+
+class PhaseProfiler(object):
+    '''Spans (phase, start ns, end ns) of the phases of the last poll cycles.
+    While disabled begin() returns None and nothing is recorded.'''
+
+    def __init__(self, cycles=100):
+        self.enabled = False
+        self.cycles = collections.deque(maxlen=cycles)
+        self.lock = threading.Lock()
+
+    def begin(self):
+        ''' Return the list to append the spans of a new cycle to, None if disabled '''
+        return [] if self.enabled else None
+
+    def end(self, cycle):
+        if cycle:
+            with self.lock:
+                self.cycles.append(cycle)
+
+    def clear(self):
+        with self.lock:
+            self.cycles.clear()
+
+    def statistics(self):
+        ''' Return the phases and their mean and max time per cycle in ms, as parallel lists '''
+        totals = collections.defaultdict(list)
+        with self.lock:
+            for cycle in self.cycles:
+                perCycle = collections.defaultdict(int)
+                for phase, start, end in cycle:
+                    perCycle[phase] += end - start
+                for phase, duration in perCycle.items():
+                    totals[phase].append(duration)
+            count = len(self.cycles)
+        phases = sorted(totals)
+        return (phases,
+                [1e-6 * sum(totals[phase]) / count for phase in phases],
+                [1e-6 * max(totals[phase]) for phase in phases])
+
+    def chromeTrace(self, process):
+        ''' Return the cycles as Chrome trace events, for chrome://tracing or Perfetto '''
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}}]
+        with self.lock:
+            events += [{"name": phase, "ph": "X", "ts": start / 1000., "dur": (end - start) / 1000.,
+                        "pid": pid, "tid": 0}
+                       for cycle in self.cycles for phase, start, end in cycle]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path, process):
+        ''' Write the Chrome trace of the cycles to path '''
+        with open(path + ".tmp", "w") as output:
+            json.dump(self.chromeTrace(process), output)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,80 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Access to the connection to the Seifert X-ray generator by priority'''
+
+import heapq
+import itertools
+import threading
+import time
+
+from SeifertXrayMetrics import LatencyHistogram
+
+# Priority levels, the lowest first
+SAFETY, SETPOINT, POLL = range(3)
+LEVELS = ("safety", "setpoint", "poll")
+
+
+class PriorityLock(object):
+    '''Serializes the use of the connection like a lock, but when it is released
+    the waiter of the most urgent level gets it, in arrival order within a
+    level. A command waits at most for the exchange in progress, so the
+    holders must hold it for one exchange at a time, not for a whole poll cycle.'''
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.held = False
+        self.waiting = [] # Heap of (level, arrival) tickets
+        self.arrivals = itertools.count()
+        self.depth = [0] * len(LEVELS) # Waiters per level
+        self.maxDepth = [0] * len(LEVELS)
+        self.waits = [LatencyHistogram(lowest=1e-5, decades=6) for level in LEVELS]
+
+    def acquire(self, level):
+        ''' Wait for the lock, return the seconds waited '''
+        start = time.perf_counter()
+        with self.condition:
+            if self.held or self.waiting:
+                ticket = (level, next(self.arrivals))
+                heapq.heappush(self.waiting, ticket)
+                self.depth[level] += 1
+                self.maxDepth[level] = max(self.maxDepth[level], self.depth[level])
+                while self.held or self.waiting[0] != ticket:
+                    self.condition.wait()
+                heapq.heappop(self.waiting)
+                self.depth[level] -= 1
+            self.held = True
+            waited = time.perf_counter() - start
+            self.waits[level].record(waited)
+        return waited
+
+    def release(self):
+        with self.condition:
+            self.held = False
+            self.condition.notify_all()
+
+    def hold(self, level):
+        ''' Return a context manager holding the lock at level '''
+        return PriorityHold(self, level)
+
+    def statistics(self):
+        ''' Return the levels with their waiters, most waiters, p99 and maximum wait in ms, as parallel lists '''
+        with self.condition:
+            return (list(LEVELS), list(self.depth), list(self.maxDepth),
+                    [1e3 * histogram.percentile(0.99) for histogram in self.waits],
+                    [1e3 * histogram.max for histogram in self.waits])
+
+
+class PriorityHold(object):
+
+    def __init__(self, lock, level):
+        self.lock = lock
+        self.level = level
+
+    def __enter__(self):
+        return self.lock.acquire(self.level)
+
+    def __exit__(self, *exception):
+        self.lock.release()
+        return False
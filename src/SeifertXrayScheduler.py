@@ -0,0 +1,66 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Polling of all the Seifert X-ray generators of a process by one scheduler'''
+
+import asyncio
+import concurrent.futures
+import threading
+
+from SeifertXrayTransport import SeifertXrayAsyncTransport
+
+
+class SeifertXrayScheduler(object):
+    '''Runs the poll cycles of all registered devices as tasks of the event loop
+    shared with SeifertXrayAsyncTransport, and their CPU work in one worker pool.
+    Every device has its own tasks, so a generator which does not reply only
+    delays its own cycles, and at most one pool job per device, so a device
+    which is slow to publish cannot take the workers of the others.'''
+
+    instance = None
+    instanceLock = threading.Lock()
+
+    @classmethod
+    def shared(cls, workers=4):
+        ''' Return the scheduler of the process, created with workers threads on first use '''
+        with cls.instanceLock:
+            if cls.instance is None:
+                cls.instance = cls(workers)
+            return cls.instance
+
+    def __init__(self, workers=4):
+        self.loop = SeifertXrayAsyncTransport.eventLoop()
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="SeifertXrayWorker")
+        self.tasks = {} # key -> poll task
+        self.jobs = {} # key -> last pool job
+
+    def register(self, key, poll, period, onError):
+        ''' Call the coroutine function poll every period() seconds, onError(exception) if it fails '''
+        self.tasks[key] = asyncio.run_coroutine_threadsafe(self.pollLoop(poll, period, onError), self.loop)
+
+    def unregister(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+        self.jobs.pop(key, None)
+
+    async def pollLoop(self, poll, period, onError):
+        while True:
+            start = self.loop.time()
+            try:
+                await poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                onError(e)
+            await asyncio.sleep(max(0., start + period() - self.loop.time()))
+
+    def submit(self, key, function, *args):
+        ''' Run function in the worker pool and return an awaitable of its result,
+        None if the previous job of key is still running. Call on the event loop. '''
+        job = self.jobs.get(key)
+        if job is not None and not job.done():
+            return None
+        job = self.jobs[key] = self.pool.submit(function, *args)
+        return asyncio.wrap_future(job, loop=self.loop)
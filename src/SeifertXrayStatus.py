@@ -0,0 +1,165 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Status word decoding tables of the Seifert X-ray generator'''
+
+'''Status Word 12 messages'''
+STATUS_WORD_12_MESSAGES = {
+    0:'No messages',
+    33:'Cooling system failed',
+    37:'Absolute undervoltage monitoring',
+    38:'Absolute overvoltage monitoring',
+    39:'Absolute undercurrent monitoring',
+    43:'Extern stop',
+    46:'EMERGENCY-STOP',
+    49:'Preselection exceeded rated power',
+    50:'Tube overpower',
+    51:'Preselection out of range',
+    52:'Presel.exceeding rated generator current',
+    53:'High voltage lamp defective',
+    55:'Relative overcurrent monitoring',
+    56:'Relative undervoltage monitoring',
+    60:'Relative undercurrent monitoring',
+    63:'Door contact 1 and 2 open',
+    64:'Door contact 1 open',
+    65:'Door contact 2 open',
+    67:'Temp. supervision cooling system',
+    70:'Tube to be warmed up?',
+    72:'Preselection out of range',
+    76:'----Stand-by----',
+    80:'Temperature supervision power module',
+    86:'HV contact faulty',
+    90:'Fault in filament circuit',
+    91:'Buffer battery empty',
+    96:'Shutter non-systematically closed',
+    97:'Shutter not connected',
+    98:'Shutter not opened',
+    99:'Shutter not closed',
+    104:'External warning lamp failed',
+    105:'Temperature supervision generator',
+    106:'Warm-up necessary',
+    108:'Power fail (low voltage)',
+    109:'Warm-up! 0=No',
+    112:'Shutter safety circuit open',
+    113:'Absolute overcurrent monitoring',
+    114:'Relative overvoltage monitoring',
+    116:'Warm-up terminated after 3 attempts',
+    117:'Warm-up aborted. Try again',
+    118:'Push START button'}
+
+
+def statusWord12Message(code):
+    '''Return the message of a Status Word 12 code, also of a code missing in the table'''
+    message = STATUS_WORD_12_MESSAGES.get(code)
+    return message if message is not None else "Unknown message {}".format(code)
+
+
+'''Status Word 12 codes of faults needing an immediate reaction: cooling system
+failed, EMERGENCY-STOP, tube overpower and shutter safety circuit open'''
+CRITICAL_STATUS_WORD_12 = (33, 46, 50, 112)
+
+'''Status Word 1 bit set when the cooling circuit is not OK'''
+COOLING_FAILED = 32
+
+
+def interlockFault(values):
+    '''Return the critical fault reported by the status words in values, None if there is none'''
+    code = values.get("statusMassage.statusWord12")
+    if code in CRITICAL_STATUS_WORD_12:
+        return "{} (code {})".format(statusWord12Message(code), code)
+    statusWord1 = values.get("sw.statusWord1")
+    if statusWord1 is not None and statusWord1 & COOLING_FAILED:
+        return "Cooling circuit not OK"
+    return None
+
+
+def shutterBits(shutter, shift):
+    '''Bits of one shutter in status word 3 or 4, from bit 7 - shift down'''
+    name = "Shutter %d" % shutter
+    return ((128 >> shift, "shutter%dCommand" % shutter, "OPEN", "CLOSED", name + " Command"),
+            (64 >> shift, "shutter%dStatus" % shutter, "OPEN", "CLOSED", name + " Status"),
+            (32 >> shift, "shutter%dNonSysClosed" % shutter, "YES", "NO", name + " Non-Systematically Closed"),
+            (16 >> shift, "shutter%dConnected" % shutter, "NO", "YES", name + " Connected"))
+
+
+'''Bit maps of the status words, shared by the decoder and the device schema.
+Each status word is (word key, binary string key, poll tier, bits) and each bit
+is (mask, property key, label if the bit is set, label if the bit is cleared,
+displayed name). A bit may appear several times when it drives more than one
+property, the displayed name is None for a property defined elsewhere in the schema.'''
+STATUS_WORD_BITS = (
+    ("sw.statusWord1", "sw.statusWord1Bin", "fast", (
+        (128, "extComputerControl", "ON", "OFF", "Ext. Computer Control"),
+        (64, "highVoltageStatus", "ON", "OFF", "High Voltage"),
+        (32, "coolingCircuit", "NOT OK", "OK", "Cooling Circuit"),
+        (16, "bufferBattery", "EMPTY", "OK", "Buffer Battery"),
+        (8, "mANomActual", "NOT OK", "OK", "mA Nom=Actual"),
+        (4, "kVNomActual", "NOT OK", "OK", "kV Nom=Actual"),
+        (2, "shutterStatus", "NOT OK", "OK", "Shutter Status"),
+    )),
+    ("sw.statusWord2", "sw.statusWord2Bin", "fast",
+        tuple((128 >> timer - 1, "timer%d" % timer, "ON", "OFF", "Timer %d" % timer) for timer in range(1, 5))
+        + tuple((8 >> shutter - 1, "shutterControl%d" % shutter, "COMPUTER", "MANUAL", "Shutter Control %d" % shutter)
+                for shutter in range(1, 5))),
+    ("sw.statusWord3", "sw.statusWord3Bin", "slow", shutterBits(1, 0) + shutterBits(2, 4)),
+    ("sw.statusWord4", "sw.statusWord4Bin", "fast",
+        shutterBits(3, 0) + ((64, "beamshutter.status", "Open", "Closed", None),) + shutterBits(4, 4)),
+    ("sw.statusWord6", "sw.statusWord6Bin", "slow", (
+        (8, "warmupProgram", "ACTIVE", "NOT ACTIVE", "Warm-Up Program"),
+        (4, "warmupAborted", "YES", "NO", "Warm-Up Aborted"),
+        (2, "warmupExtComputer", "YES", "NO", "Warm-Up via External Computer"),
+        (1, "warmupKeyboard", "YES", "NO", "Warm-Up via Keyboard"),
+    )),
+)
+
+
+def statusWordSchema():
+    '''Return the schema descriptors of the status words, as (word key, displayed name,
+    poll tier, alias, binary string key, binary description) per word and
+    (property key, displayed name, description) per bit property'''
+    words, properties = [], []
+    for wordKey, binKey, tier, bits in STATUS_WORD_BITS:
+        number = int(wordKey[len("sw.statusWord"):])
+        names = dict((mask, name) for mask, key, setLabel, clearLabel, name in reversed(bits) if name)
+        layout = "|".join(names.get(1 << bit, "Not used") for bit in range(7, -1, -1))
+        words.append((wordKey, "Status Word %d" % number, tier, ";;SR:%02d;*{%s:d};" % (number, wordKey),
+                      binKey, "Status Word %d: %s" % (number, layout)))
+        properties.extend((key, name, "%s: %s | %s" % (name, setLabel, clearLabel))
+                          for mask, key, setLabel, clearLabel, name in bits if name)
+    return tuple(words), tuple(properties)
+
+
+'''Built once per process, the device schema is generated from them'''
+STATUS_WORD_SCHEMA = statusWordSchema()
+
+
+def statusWordEntry(binKey, bits, value):
+    '''Return the properties derived from one status word value'''
+    entry = [(binKey, "{0:08b}".format(value))]
+    for mask, key, setLabel, clearLabel, name in bits:
+        entry.append((key, setLabel if value & mask else clearLabel))
+    return dict(entry)
+
+
+def buildStatusWordTable(binKey, bits):
+    '''Precompute the derived properties for all 256 byte values'''
+    return tuple(statusWordEntry(binKey, bits, value) for value in range(256))
+
+
+'''Lookup tables, one (word key, binary string key, bits, table) per status word'''
+STATUS_WORD_TABLES = tuple((wordKey, binKey, bits, buildStatusWordTable(binKey, bits))
+                           for wordKey, binKey, tier, bits in STATUS_WORD_BITS)
+
+
+def decodeStatusWords(values, derived):
+    '''Decode the status words found in values into derived'''
+    for wordKey, binKey, bits, table in STATUS_WORD_TABLES:
+        value = values.get(wordKey)
+        if value is None:
+            continue
+        if 0 <= value < 256:
+            derived.update(table[value])
+        else:
+            # Not a byte, should not happen but decode it the slow way
+            derived.update(statusWordEntry(binKey, bits, value))
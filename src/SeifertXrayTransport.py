@@ -0,0 +1,538 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Socket level communication with the Seifert X-ray generator'''
+
+import asyncio
+import collections
+import concurrent.futures
+import gzip
+import re
+import socket
+import threading
+import time
+
+# A {key} or {key:format} field of an alias
+ALIAS_FIELD = re.compile(r"\{([^{}:]+)(?::([^{}]*))?\}")
+
+# The value of a {key:d} field, always 10 zero padded digits
+INT_REPLY_VALUE = re.compile(rb"\d{10}\Z")
+
+
+class AliasPlan(object):
+    '''The alias "write;writeReply;query;queryReply;" of a parameter, compiled once
+    into what is needed to send its commands and parse its replies'''
+
+    __slots__ = ("key", "writeParts", "writeMnemonic", "terminator", "query", "queryBytes",
+                 "replyPrefix", "replySuffix", "replyValue", "replyIsInt")
+
+    def __init__(self, key, alias, terminator="\n"):
+        fields = alias.split(";")
+        self.key = key
+
+        # Write template as (literal, None, None) and (None, key, format spec) parts
+        self.writeParts = None
+        if fields[0]:
+            self.writeParts = []
+            position = 0
+            for match in ALIAS_FIELD.finditer(fields[0]):
+                if match.start() > position:
+                    self.writeParts.append((fields[0][position:match.start()], None, None))
+                self.writeParts.append((None, match.group(1), match.group(2) or ""))
+                position = match.end()
+            if position < len(fields[0]):
+                self.writeParts.append((fields[0][position:], None, None))
+            self.writeParts = tuple(self.writeParts)
+        # Write command without its values, e.g. "SC" for "SC:{current.setpoint}"
+        self.writeMnemonic = fields[0].split("{", 1)[0].rstrip(":,") or None
+        self.terminator = terminator
+
+        # Query already encoded, reply as prefix{field}suffix
+        self.query = fields[2] if len(fields) > 2 else ""
+        self.queryBytes = (self.query + terminator).encode() if self.query else None
+        self.replyPrefix = self.replySuffix = b""
+        self.replyIsInt = False
+        if len(fields) > 3 and fields[3]:
+            match = ALIAS_FIELD.search(fields[3])
+            self.replyPrefix = fields[3][:match.start()].encode()
+            self.replySuffix = fields[3][match.end():].encode()
+            self.replyIsInt = match.group(2) == "d"
+        self.replyValue = slice(len(self.replyPrefix), -len(self.replySuffix) or None)
+
+    def formatWrite(self, getValue):
+        ''' Return the write command, getValue(key) gives the values of the fields '''
+        return "".join(literal if key is None else format(getValue(key), spec)
+                       for literal, key, spec in self.writeParts)
+
+    def writeBytes(self, getValue):
+        ''' Return the encoded and terminated write command '''
+        return (self.formatWrite(getValue) + self.terminator).encode()
+
+    def parse(self, frame):
+        ''' Return the value in a reply frame like b"*0000017000", bytes or a memoryview '''
+        frame = bytes(frame) # The one copy of a memoryview frame, none of bytes
+        if not frame.startswith(self.replyPrefix) or not frame.endswith(self.replySuffix):
+            raise ValueError("Reply %r to %s is malformed" % (frame, self.query))
+        value = frame[self.replyValue]
+        if self.replyIsInt:
+            # int() alone would take a sign, spaces or a truncated reply
+            if not INT_REPLY_VALUE.match(value):
+                raise ValueError("Reply %r to %s is not 10 digits" % (frame, self.query))
+            return int(value)
+        return value.decode()
+
+
+def enableKeepAlive(sock, idle=10, interval=5, count=3):
+    '''Let the OS detect a dead peer: probe after idle s, every interval s, count times'''
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # The fine tuning is not available on all platforms
+    for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+def openSocket(host, port, timeout, keepAlive=False):
+    '''Open a TCP connection to the generator'''
+    sock = socket.create_connection((host, port), timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if keepAlive:
+        enableKeepAlive(sock)
+    return sock
+
+
+def isConnectionError(error):
+    '''Tell whether error means the connection is lost, a timeout does not'''
+    return isinstance(error, (OSError, asyncio.IncompleteReadError)) and not isinstance(error, socket.timeout)
+
+
+class ReconnectBackoff(object):
+    '''Exponentially growing delays between reconnection attempts'''
+
+    def __init__(self, initial=0.5, maximum=30.):
+        self.maximum = maximum
+        self.delay = initial
+
+    def nextDelay(self):
+        ''' Return the delay before the next attempt '''
+        delay = self.delay
+        self.delay = min(2 * self.delay, self.maximum)
+        return delay
+
+
+class ReplyFramer(object):
+    '''Splits the received bytes into frames at the terminator, in a preallocated
+    buffer filled with recv_into. The frames are memoryviews into the buffer,
+    not copies, valid until begin() is called again. A partial frame waits for
+    the rest, several frames of one read are returned one by one, and
+    anything longer than maxFrame is garbage, dropped up to the next
+    terminator.'''
+
+    def __init__(self, terminator=b"\n", size=4096, maxFrame=256):
+        self.terminator = terminator
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.maxFrame = maxFrame
+        self.start = 0 # Start of the received bytes not returned in a frame yet
+        self.end = 0 # End of the received bytes
+        self.skipping = False # Dropping garbage up to the next terminator
+        self.discarded = 0 # Number of garbage and out of sync bytes dropped
+
+    def begin(self):
+        ''' Make room for the replies of a new exchange, invalidating the frames returned so far '''
+        remaining = self.end - self.start
+        if remaining and self.start:
+            self.view[:remaining] = self.view[self.start:self.end]
+        self.start, self.end = 0, remaining
+
+    def pending(self):
+        ''' Tell whether received bytes were not returned in a frame '''
+        return self.end > self.start or self.skipping
+
+    def clear(self):
+        ''' Drop the received bytes not returned in a frame '''
+        self.discarded += self.end - self.start
+        self.start = self.end = 0
+        self.skipping = False
+
+    def receive(self, sock):
+        ''' Read from sock into the buffer, return the number of bytes read, 0 if closed '''
+        if self.end == len(self.buffer):
+            raise ValueError("Replies exceed the receive buffer of %d bytes" % len(self.buffer))
+        count = sock.recv_into(self.view[self.end:])
+        self.end += count
+        return count
+
+    def nextFrame(self):
+        ''' Return the next complete frame without terminator, None if there is none yet '''
+        while True:
+            index = self.buffer.find(self.terminator, self.start, self.end)
+            if index < 0:
+                if self.skipping or self.end - self.start > self.maxFrame:
+                    self.discarded += self.end - self.start
+                    self.end = self.start
+                    self.skipping = True
+                return None
+            if self.skipping or index - self.start > self.maxFrame:
+                self.discarded += index + len(self.terminator) - self.start
+                self.start = index + len(self.terminator)
+                self.skipping = False
+                continue
+            frame = self.view[self.start:index]
+            self.start = index + len(self.terminator)
+            return frame
+
+
+class TrafficRecorder(object):
+    '''Capture of the commands sent to the generator and of its replies, in a gzip
+    compressed text file. After a header line, every line is a write
+    "sent<TAB>command" or a query "sent<TAB>command<TAB>latency<TAB>reply",
+    times in seconds since the header. A lost reply has latency "-".'''
+
+    def __init__(self, path, terminator="\n"):
+        self.path = path
+        self.terminator = terminator.encode()
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "wt")
+        self.file.write("# SeifertXray capture started %.6f\n" % self.start)
+
+    def commands(self, data):
+        return [command.decode("ascii", "replace") for command in data.split(self.terminator)[:-1]]
+
+    def write(self, sent, data):
+        ''' Record the commands without reply in data, sent at time sent '''
+        lines = ["%.6f\t%s\n" % (sent - self.start, command) for command in self.commands(data)]
+        self.writeLines(lines)
+
+    def exchange(self, sent, data, frames, received):
+        ''' Record the queries in data with their reply frames '''
+        latency = received - sent
+        lines = ["%.6f\t%s\t%.6f\t%s\n" % (sent - self.start, command, latency,
+                                            bytes(frame).decode("ascii", "replace"))
+                 for command, frame in zip(self.commands(data), frames)]
+        self.writeLines(lines)
+
+    def lost(self, sent, data):
+        ''' Record the queries in data, which got no reply '''
+        lines = ["%.6f\t%s\t-\t\n" % (sent - self.start, command) for command in self.commands(data)]
+        self.writeLines(lines)
+
+    def writeLines(self, lines):
+        with self.lock:
+            # Traffic still in flight when the capture is stopped is not recorded
+            if not self.file.closed:
+                self.file.writelines(lines)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def readCapture(path):
+    '''Return the records of a TrafficRecorder file as (sent, command, latency, reply) tuples.
+    latency and reply are None for a write, a lost reply has reply None and an infinite latency.'''
+    records = []
+    with gzip.open(path, "rt") as capture:
+        for line in capture:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) == 2:
+                records.append((float(fields[0]), fields[1], None, None))
+            elif fields[2] == "-":
+                records.append((float(fields[0]), fields[1], float("inf"), None))
+            else:
+                records.append((float(fields[0]), fields[1], float(fields[2]), fields[3]))
+    return records
+
+
+class SeifertXrayConnection(object):
+    '''Blocking request/reply exchange with the generator over a TCP socket.
+    After a timeout, the late replies must be dropped before the next
+    exchange: call settle() before taking the lock which serializes the
+    exchanges, so that the wait for them does not hold it.'''
+
+    # Seconds a resync may take beyond its quiet window before the line is considered broken
+    RESYNC_LIMIT = 0.5
+
+    def __init__(self, terminator="\n", timeout=1.0, keepAlive=False):
+        self.socket = None
+        self.terminator = terminator.encode()
+        self.timeout = timeout
+        self.keepAlive = keepAlive
+        self.framer = ReplyFramer(self.terminator)
+        self.lateUntil = 0. # time.time() until which late replies of a timed out exchange may arrive
+        self.recorder = None # TrafficRecorder capturing the traffic, if any
+
+    def attach(self, sock):
+        ''' Use sock, typically the socket opened by the base device '''
+        if sock is not self.socket:
+            self.socket = sock
+            self.framer.clear()
+            # A write has no reply to carry the ACK, without this the next
+            # query waits for the delayed ACK (Nagle)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.keepAlive:
+                enableKeepAlive(sock)
+
+    def send(self, data):
+        ''' Send encoded and terminated commands which have no reply '''
+        self.socket.sendall(data)
+        if self.recorder is not None:
+            self.recorder.write(time.time(), data)
+
+    def readFrame(self, deadline):
+        ''' Read the next reply frame, without terminator '''
+        frame = self.framer.nextFrame()
+        while frame is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout("No reply from the generator")
+            self.socket.settimeout(remaining)
+            if not self.framer.receive(self.socket):
+                raise socket.error("Connection closed by the generator")
+            frame = self.framer.nextFrame()
+        return frame
+
+    def exchange(self, data, count, timeout=None):
+        ''' Send encoded queries and return their count reply frames in order, as
+        memoryviews valid until the next exchange. All replies must arrive within
+        timeout seconds, by default self.timeout. '''
+        if self.framer.pending() or self.lateUntil:
+            # Left over from an earlier failed exchange, it would shift all replies
+            self.resync(until=self.lateUntil)
+            self.lateUntil = 0.
+        if timeout is None:
+            timeout = self.timeout
+        self.framer.begin()
+        self.socket.sendall(data)
+        sent = time.time()
+        deadline = sent + timeout
+        try:
+            frames = [self.readFrame(deadline) for index in range(count)]
+        except socket.timeout:
+            if self.recorder is not None:
+                self.recorder.lost(sent, data)
+            # A late reply would be taken for the reply to the next query,
+            # it may take as long again, see settle
+            self.lateUntil = time.time() + timeout
+            raise
+        if self.recorder is not None:
+            self.recorder.exchange(sent, data, frames, time.time())
+        return frames
+
+    def settle(self):
+        ''' Wait until the late replies of a timed out exchange must have arrived, without holding the connection '''
+        delay = self.lateUntil - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def resync(self, quiet=0.05, until=0.):
+        ''' Drop all received and in-flight bytes, until the line has been quiet for quiet
+        seconds and not before until. Raise socket.error if it is not quiet
+        RESYNC_LIMIT seconds later. '''
+        self.framer.clear()
+        now = time.time()
+        quietUntil = max(until, now + quiet)
+        deadline = max(until, now) + quiet + self.RESYNC_LIMIT
+        while now < quietUntil:
+            if now >= deadline:
+                raise socket.error("The generator does not stop sending")
+            self.socket.settimeout(min(quietUntil, deadline) - now)
+            try:
+                count = self.socket.recv_into(self.framer.view)
+                if not count:
+                    raise socket.error("Connection closed by the generator")
+                self.framer.discarded += count
+                quietUntil = max(quietUntil, time.time() + quiet)
+            except socket.timeout:
+                pass
+            now = time.time()
+
+
+class SeifertXrayAsyncTransport(object):
+    '''Communication with the generator on an asyncio event loop.
+    One event loop thread is shared by all transports of the process. Replies
+    are framed by a single reader task and matched to the queries in order,
+    so only one exchange is outstanding at a time. When a reply is missing the transport is out of sync: the replies are
+    dropped and no query is sent until the line has been quiet for the timeout.
+    The blocking methods send, exchange and resync have the same meaning as
+    in SeifertXrayConnection, the coroutines can be awaited directly on the
+    shared loop.'''
+
+    loop = None
+    loopLock = threading.Lock()
+
+    @classmethod
+    def eventLoop(cls):
+        ''' Return the shared event loop, started on first use '''
+        with cls.loopLock:
+            if cls.loop is None:
+                cls.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=cls.loop.run_forever, name="SeifertXrayAsyncTransport")
+                thread.daemon = True
+                thread.start()
+            return cls.loop
+
+    def __init__(self, host, port, terminator="\n", timeout=1.0, connectTimeout=5.0, keepAlive=False):
+        self.host = host
+        self.port = port
+        self.terminator = terminator.encode()
+        self.timeout = timeout
+        self.connectTimeout = connectTimeout
+        self.keepAlive = keepAlive
+        self.reader = None
+        self.writer = None
+        self.readerTask = None
+        self.waiting = collections.deque() # Futures of the queries waiting for a reply
+        self.exchangeLock = asyncio.Lock() # Held from sending the queries to their last reply
+        self.desynced = False # A reply was lost, the replies cannot be matched to the queries
+        self.lastReceived = 0. # Loop time of the last reply, or of the loss of sync
+        self.recorder = None # TrafficRecorder capturing the traffic, if any
+
+    def run(self, coroutine, timeout):
+        ''' Run coroutine on the shared loop and wait at most timeout seconds for its result '''
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.eventLoop())
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if future.done():
+                raise # Raised by the coroutine
+            future.cancel()
+            raise socket.timeout("No result from the event loop within {} s".format(timeout))
+
+    async def connectAsync(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connectTimeout)
+        if self.keepAlive:
+            enableKeepAlive(self.writer.get_extra_info("socket"))
+        self.readerTask = asyncio.ensure_future(self.readLoop())
+
+    async def closeAsync(self):
+        if self.readerTask is not None:
+            self.readerTask.cancel()
+            self.readerTask = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.failWaiting(socket.error("Connection closed"))
+
+    def failWaiting(self, exception):
+        while self.waiting:
+            future = self.waiting.popleft()
+            if not future.done():
+                future.set_exception(exception)
+
+    def loseSync(self):
+        ''' A reply is missing: fail the waiting queries, the next replies cannot be matched to them '''
+        self.desynced = True
+        self.lastReceived = self.eventLoop().time()
+        self.failWaiting(socket.timeout("Replies out of sync"))
+
+    async def readLoop(self):
+        ''' Frame the replies and hand them to the waiting queries in order '''
+        try:
+            while True:
+                reply = await self.reader.readuntil(self.terminator)
+                self.lastReceived = self.eventLoop().time()
+                if self.desynced or not self.waiting:
+                    continue # Late or unsolicited
+                future = self.waiting.popleft()
+                if not future.done():
+                    future.set_result(reply[:-len(self.terminator)])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self.failWaiting(socket.error("Connection lost: {}".format(e)))
+
+    async def sendAsync(self, data, record=True):
+        ''' Send encoded and terminated commands which have no reply '''
+        if self.writer is None:
+            raise socket.error("Not connected to {}:{}".format(self.host, self.port))
+        self.writer.write(data)
+        if record and self.recorder is not None:
+            self.recorder.write(time.time(), data)
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+        except asyncio.TimeoutError:
+            raise socket.error("The generator does not take commands")
+
+    async def exchangeAsync(self, data, count, timeout=None):
+        ''' Send encoded queries and return their count reply frames in order, after the
+        exchange in progress: with two outstanding, a lost reply of one would shift
+        the replies of the other, and they would still parse as valid values '''
+        if timeout is None:
+            timeout = self.timeout
+        async with self.exchangeLock:
+            if self.desynced:
+                await self.waitQuiet(self.timeout)
+            loop = self.eventLoop()
+            futures = [loop.create_future() for index in range(count)]
+            self.waiting.extend(futures)
+            try:
+                await self.sendAsync(data, record=False)
+            except BaseException:
+                # Nobody will await the replies, failWaiting must not fail them
+                self.waiting.clear()
+                for future in futures:
+                    future.cancel()
+                raise
+            sent = time.time()
+            try:
+                frames = await asyncio.wait_for(asyncio.gather(*futures), timeout)
+            except asyncio.TimeoutError:
+                self.loseSync()
+                if self.recorder is not None:
+                    self.recorder.lost(sent, data)
+                raise socket.timeout("No reply from the generator")
+            except asyncio.CancelledError:
+                self.loseSync()
+                raise
+        if self.recorder is not None:
+            self.recorder.exchange(sent, data, frames, time.time())
+        return frames
+
+    async def resyncAsync(self, quiet):
+        ''' Drop the replies until the line has been quiet for quiet seconds, between exchanges '''
+        async with self.exchangeLock:
+            await self.waitQuiet(quiet)
+
+    async def waitQuiet(self, quiet):
+        ''' Drop the replies until the line has been quiet for quiet seconds, holding exchangeLock '''
+        self.desynced = True
+        self.failWaiting(socket.timeout("Replies out of sync"))
+        loop = self.eventLoop()
+        remaining = self.lastReceived + quiet - loop.time()
+        while remaining > 0:
+            await asyncio.sleep(remaining)
+            remaining = self.lastReceived + quiet - loop.time()
+        self.desynced = False
+
+    # The blocking methods wait for the deadlines of their coroutine, plus a timeout to spare
+
+    def settle(self):
+        ''' Wait until the line should be quiet again after a lost reply, without holding the connection '''
+        if self.desynced:
+            time.sleep(max(0., self.lastReceived + self.timeout - self.eventLoop().time()))
+
+    def open(self):
+        ''' Connect, waiting at most connectTimeout '''
+        self.run(self.connectAsync(), self.connectTimeout + self.timeout)
+
+    def close(self):
+        self.run(self.closeAsync(), self.timeout)
+
+    def send(self, data):
+        self.run(self.sendAsync(data), 2 * self.timeout)
+
+    def exchange(self, data, count, timeout=None):
+        # The exchange in progress, a quiet line if out of sync, sending and the replies
+        timeout = self.timeout if timeout is None else timeout
+        return self.run(self.exchangeAsync(data, count, timeout), 4 * self.timeout + 2 * timeout)
+
+    def resync(self, quiet=0.05):
+        self.run(self.resyncAsync(quiet), quiet + 3 * self.timeout)
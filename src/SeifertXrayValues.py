@@ -0,0 +1,46 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Values derived from the parameters polled from the Seifert X-ray generator'''
+
+from SeifertXrayStatus import decodeStatusWords, statusWord12Message
+
+
+def deriveExposureTimer(totalSec, derived):
+    '''Exposure timer actual value in sec., convert to hh,mm,ss'''
+    mm, ss = divmod(totalSec, 60)
+    hh, mm = divmod(mm, 60)
+    derived["exposuretimerActual.totalSec"] = totalSec
+    derived["exposuretimerActual.hours"] = hh
+    derived["exposuretimerActual.minutes"] = mm
+    derived["exposuretimerActual.seconds"] = ss
+
+
+def deriveValues(raw):
+    '''Return the polled values in raw together with the values derived from them'''
+    derived = dict(raw)
+
+    # Current setpoint is returned in uA, convert to mA
+    if "current.target" in raw:
+        derived["current.target"] = raw["current.target"] // 1000
+    # To avoid flickering of the actual value from uA<->mA the mA value is stored in another parameter
+    if "current.actual" in raw:
+        derived["current.actual_milli"] = raw["current.actual"] // 1000
+
+    # Voltage setpoint returned in Volt, convert to kV
+    if "voltage.target" in raw:
+        derived["voltage.target"] = raw["voltage.target"] // 1000
+    # To avoid flickering of the actual value from Volts<->Kilovolts the kV value is stored in another parameter
+    if "voltage.actual" in raw:
+        derived["voltage.actual_kilo"] = raw["voltage.actual"] // 1000
+
+    if "exposuretimerActual.totalSec" in raw:
+        deriveExposureTimer(raw["exposuretimerActual.totalSec"], derived)
+
+    decodeStatusWords(raw, derived)
+
+    if "statusMassage.statusWord12" in raw:
+        derived["statusMassage.statusWord12Str"] = statusWord12Message(raw["statusMassage.statusWord12"])
+
+    return derived
@@ -4,9 +4,28 @@ __author__="gabriele.giambartolomei@desy.de"
 __date__ ="June, 2015, 10:56 AM"
 __copyright__="Copyright (c) 2010-2015 European XFEL GmbH Hamburg. All rights reserved."
 
+import sys
+import threading
+
 from karabo.configurator import Configurator
 from GeSeifertXray import *
 
 if __name__ == "__main__":
-    device = Configurator(PythonDevice).create("GeSeifertXray", Hash("Logger.priority", "DEBUG", "deviceId", "GeSeifertXrayMain_0"))
-    device.run()
+    # main.py [hostname:port ...], several generators share one scheduler
+    generators = [address.rsplit(":", 1) for address in sys.argv[1:]]
+    devices = []
+    for index, generator in enumerate(generators or [None]):
+        configuration = Hash("Logger.priority", "DEBUG", "deviceId", "GeSeifertXrayMain_{}".format(index))
+        if generator is not None:
+            configuration.set("hostname", generator[0])
+            configuration.set("port", int(generator[1]))
+        if len(generators) > 1:
+            configuration.set("transport", "asyncio")
+            configuration.set("sharedScheduler", True)
+        devices.append(Configurator(PythonDevice).create("GeSeifertXray", configuration))
+    
+    for device in devices[1:]:
+        thread = threading.Thread(target=device.run)
+        thread.daemon = True
+        thread.start()
+    devices[0].run()
@@ -0,0 +1,626 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Benchmarks of the GeSeifertXray device code which runs without Karabo.
+
+The micro-benchmarks need nothing else. The suite also runs poll cycles and
+commands against SeifertXrayHwSimulator, started here or already running,
+with latency injected by a proxy in between:
+
+    python GeSeifertXray_Benchmark.py --start-simulator --latency 2 --output results.json
+    python GeSeifertXray_Benchmark.py --start-simulator --baseline results.json
+    python GeSeifertXray_Benchmark.py --start-simulator --faults SeifertXrayHwSimulator_faults.json
+    python GeSeifertXray_Benchmark.py --no-simulator --capture production.capture.gz
+
+Results are written as JSON. Compared with a baseline, every metric worse by
+more than the tolerance is reported and the exit code is 1.'''
+
+import argparse
+import json
+import os
+import platform
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SeifertXrayCountdown import ExposureCountdown
+from SeifertXrayMetrics import LatencyRecorder, PhaseProfiler, RingBuffer
+from SeifertXrayPriority import POLL, SAFETY, PriorityLock
+from SeifertXrayStatus import STATUS_WORD_BITS, buildStatusWordTable, decodeStatusWords, statusWordSchema
+from SeifertXrayTransport import AliasPlan, ReplyFramer, SeifertXrayConnection, openSocket, readCapture
+from SeifertXrayValues import deriveValues
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SeifertXrayHwSimulator.py")
+
+
+def branchyDecode(values, derived):
+    '''The former hand-written decoding of pollInstrumentSpecific, kept as reference'''
+    sw1 = values["sw.statusWord1"]
+    derived["sw.statusWord1Bin"] = "{0:08b}".format(sw1)
+    derived["extComputerControl"] = "ON" if sw1 & 128 else "OFF"
+    derived["highVoltageStatus"] = "ON" if sw1 & 64 else "OFF"
+    derived["coolingCircuit"] = "NOT OK" if sw1 & 32 else "OK"
+    derived["bufferBattery"] = "EMPTY" if sw1 & 16 else "OK"
+    derived["mANomActual"] = "NOT OK" if sw1 & 8 else "OK"
+    derived["kVNomActual"] = "NOT OK" if sw1 & 4 else "OK"
+    derived["shutterStatus"] = "NOT OK" if sw1 & 2 else "OK"
+
+    sw2 = values["sw.statusWord2"]
+    derived["sw.statusWord2Bin"] = "{0:08b}".format(sw2)
+    derived["timer1"] = "ON" if sw2 & 128 else "OFF"
+    derived["timer2"] = "ON" if sw2 & 64 else "OFF"
+    derived["timer3"] = "ON" if sw2 & 32 else "OFF"
+    derived["timer4"] = "ON" if sw2 & 16 else "OFF"
+    derived["shutterControl1"] = "COMPUTER" if sw2 & 8 else "MANUAL"
+    derived["shutterControl2"] = "COMPUTER" if sw2 & 4 else "MANUAL"
+    derived["shutterControl3"] = "COMPUTER" if sw2 & 2 else "MANUAL"
+    derived["shutterControl4"] = "COMPUTER" if sw2 & 1 else "MANUAL"
+
+    sw3 = values["sw.statusWord3"]
+    derived["sw.statusWord3Bin"] = "{0:08b}".format(sw3)
+    derived["shutter1Command"] = "OPEN" if sw3 & 128 else "CLOSED"
+    derived["shutter1Status"] = "OPEN" if sw3 & 64 else "CLOSED"
+    derived["shutter1NonSysClosed"] = "YES" if sw3 & 32 else "NO"
+    derived["shutter1Connected"] = "NO" if sw3 & 16 else "YES"
+    derived["shutter2Command"] = "OPEN" if sw3 & 8 else "CLOSED"
+    derived["shutter2Status"] = "OPEN" if sw3 & 4 else "CLOSED"
+    derived["shutter2NonSysClosed"] = "YES" if sw3 & 2 else "NO"
+    derived["shutter2Connected"] = "NO" if sw3 & 1 else "YES"
+
+    sw4 = values["sw.statusWord4"]
+    derived["sw.statusWord4Bin"] = "{0:08b}".format(sw4)
+    derived["shutter3Command"] = "OPEN" if sw4 & 128 else "CLOSED"
+    derived["shutter3Status"] = "OPEN" if sw4 & 64 else "CLOSED"
+    derived["beamshutter.status"] = "Open" if sw4 & 64 else "Closed"
+    derived["shutter3NonSysClosed"] = "YES" if sw4 & 32 else "NO"
+    derived["shutter3Connected"] = "NO" if sw4 & 16 else "YES"
+    derived["shutter4Command"] = "OPEN" if sw4 & 8 else "CLOSED"
+    derived["shutter4Status"] = "OPEN" if sw4 & 4 else "CLOSED"
+    derived["shutter4NonSysClosed"] = "YES" if sw4 & 2 else "NO"
+    derived["shutter4Connected"] = "NO" if sw4 & 1 else "YES"
+
+    sw6 = values["sw.statusWord6"]
+    derived["sw.statusWord6Bin"] = "{0:08b}".format(sw6)
+    derived["warmupProgram"] = "ACTIVE" if sw6 & 8 else "NOT ACTIVE"
+    derived["warmupAborted"] = "YES" if sw6 & 4 else "NO"
+    derived["warmupExtComputer"] = "YES" if sw6 & 2 else "NO"
+    derived["warmupKeyboard"] = "YES" if sw6 & 1 else "NO"
+
+
+def fakeStatusWords(value):
+    '''Return polled values with all status words set to value'''
+    return {"sw.statusWord1": value, "sw.statusWord2": value, "sw.statusWord3": value,
+            "sw.statusWord4": value, "sw.statusWord6": value}
+
+
+def benchmarkStatusDecode(repeat=5, number=20000):
+    '''Compare the branchy and the table-driven status word decoding, times in us per poll'''
+    for value in range(256):
+        branchy, table = {}, {}
+        branchyDecode(fakeStatusWords(value), branchy)
+        decodeStatusWords(fakeStatusWords(value), table)
+        assert branchy == table, "decoders disagree for value %d" % value
+
+    values = fakeStatusWords(0b10100101)
+    results = {}
+    for name, decode in (("branchy", branchyDecode), ("table", decodeStatusWords)):
+        timer = timeit.Timer(lambda: decode(values, {}))
+        results[name] = min(timer.repeat(repeat, number)) / number * 1e6
+    return results
+
+
+# The polled aliases of GeSeifertXray with a typical reply
+POLLED_ALIASES = (
+    ("current.target", ";;CN;*{current.target:d};", b"*0000017000"),
+    ("current.actual", ";;CA;*{current.actual:d};", b"*0000017000"),
+    ("voltage.target", ";;VN;*{voltage.target:d};", b"*0000019000"),
+    ("voltage.actual", ";;VA;*{voltage.actual:d};", b"*0000019000"),
+    ("exposuretimer.target", ";;TN:3;*{exposuretimer.target:d};", b"*0000045246"),
+    ("exposuretimerActual.totalSec", ";;TA:3;*{exposuretimerActual.totalSec:d};", b"*0000045246"),
+    ("statusMassage.statusWord12", ";;SR:12;*{statusMassage.statusWord12:d};", b"*0000000076"),
+    ("sw.statusWord1", ";;SR:01;*{sw.statusWord1:d};", b"*0000000032"),
+    ("sw.statusWord2", ";;SR:02;*{sw.statusWord2:d};", b"*0000000032"),
+    ("sw.statusWord3", ";;SR:03;*{sw.statusWord3:d};", b"*0000000016"),
+    ("sw.statusWord4", ";;SR:04;*{sw.statusWord4:d};", b"*0000000008"),
+    ("sw.statusWord6", ";;SR:06;*{sw.statusWord6:d};", b"*0000000004"),
+    ("sw.statusWord14Actual", ";;SR:14;*{sw.statusWord14Actual:d};", b"*0000000100"),
+    ("sw.statusWord15", ";;SR:15;*{sw.statusWord15:d};", b"*0000000090"),
+    ("warmup.timeleft", ";;WT;*{warmup.timeleft:d};", b"*0000000999"),
+    ("focus.string", ";;FR;*{focus.string};", b"*0.15 x 8 mm"),
+    ("anode.material", ";;MR;*{anode.material};", b"*Co"),
+)
+
+
+def parseReply(template, reply):
+    '''The former per-reply parsing of a template like "*{current.target:d}", kept as reference'''
+    prefix, field = template.split("{", 1)
+    if not reply.startswith(prefix):
+        raise ValueError("Reply %r does not match %r" % (reply, template))
+    value = reply[len(prefix):]
+    if field.rstrip("}").endswith(":d"):
+        return int(value)
+    return value
+
+
+def templateCycle():
+    '''String work of one poll cycle when the aliases are split and parsed every time'''
+    raw = {}
+    for key, alias, frame in POLLED_ALIASES:
+        fields = alias.split(";")
+        query = (fields[2] + "\n").encode()
+        raw[key] = parseReply(fields[3], frame.decode())
+    return raw
+
+
+PLANS = tuple((AliasPlan(key, alias), frame) for key, alias, frame in POLLED_ALIASES)
+
+
+def planCycle():
+    '''String work of one poll cycle with compiled alias plans'''
+    raw = {}
+    for plan, frame in PLANS:
+        query = plan.queryBytes
+        raw[plan.key] = plan.parse(frame)
+    return raw
+
+
+def benchmarkAliasPlans(repeat=5, number=20000):
+    '''Compare per-cycle alias parsing with compiled plans, times in us per poll cycle'''
+    assert templateCycle() == planCycle(), "plans parse differently"
+    results = {}
+    for name, cycle in (("templates", templateCycle), ("plans", planCycle)):
+        results[name] = min(timeit.Timer(cycle).repeat(repeat, number)) / number * 1e6
+    return results
+
+
+def decodeCycle():
+    '''Work of pollInstrumentSpecific on the replies of one poll cycle, without the I/O'''
+    return deriveValues(planCycle())
+
+
+def benchmarkDecode(repeat=5, number=20000):
+    '''Decoding of a full poll cycle in isolation, time in us per poll cycle'''
+    return {"cycle": min(timeit.Timer(decodeCycle).repeat(repeat, number)) / number * 1e6}
+
+
+def benchmarkStatusTables(repeat=5, number=200):
+    '''Building the status word descriptors of the device schema and the decoding tables,
+    done once per process at import, in us. The Karabo part of the schema is
+    measured by the device itself, see startup.schemaBuild.'''
+    tables = lambda: [buildStatusWordTable(binKey, bits) for wordKey, binKey, tier, bits in STATUS_WORD_BITS]
+    return {"schema": min(timeit.Timer(statusWordSchema).repeat(repeat, number)) / number * 1e6,
+            "decoding": min(timeit.Timer(tables).repeat(repeat, number)) / number * 1e6}
+
+
+class ChunkSocket(object):
+    '''Replays the replies of one poll cycle in fixed chunks, like the kernel would hand them out'''
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.index = 0
+
+    def nextChunk(self):
+        chunk = self.chunks[self.index]
+        self.index = (self.index + 1) % len(self.chunks)
+        return chunk
+
+    def recv(self, size):
+        return bytes(memoryview(self.nextChunk())) # A new object, like socket.recv
+
+    def recv_into(self, view):
+        chunk = self.nextChunk()
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def concatenatedCycle(sock):
+    '''The former framing of SeifertXrayConnection.readFrame, bytes concatenation and split,
+    and the parsing of the replies of one poll cycle'''
+    pending = b""
+    raw = {}
+    for plan, reply in PLANS:
+        while b"\n" not in pending:
+            pending += sock.recv(4096)
+        frame, pending = pending.split(b"\n", 1)
+        raw[plan.key] = plan.parse(frame)
+    return raw
+
+
+def framerCycle(sock, framer):
+    '''Framing with ReplyFramer into its preallocated buffer and the parsing of the
+    replies of one poll cycle'''
+    framer.begin()
+    raw = {}
+    for plan, reply in PLANS:
+        frame = framer.nextFrame()
+        while frame is None:
+            framer.receive(sock)
+            frame = framer.nextFrame()
+        raw[plan.key] = plan.parse(frame)
+    return raw
+
+
+def transientPeak(cycle, number=1000):
+    '''Peak memory allocated within one poll cycle, in bytes, including the values it returns'''
+    cycle()
+    tracemalloc.start()
+    peak = 0
+    for index in range(number):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        cycle()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return peak
+
+
+def benchmarkFraming(repeat=5, number=10000):
+    '''Framing and parsing of the replies of one poll cycle, read in one chunk and in
+    chunks of 5 bytes, in us per poll cycle, and the transient bytes of a cycle (...Bytes)'''
+    data = b"".join(reply + b"\n" for plan, reply in PLANS)
+    results = {}
+    for split, chunks in (("Coalesced", [data]), ("Split", [data[i:i + 5] for i in range(0, len(data), 5)])):
+        framer = ReplyFramer()
+        cases = (("concatenated", lambda: concatenatedCycle(ChunkSocket(chunks))),
+                 ("framer", lambda: framerCycle(ChunkSocket(chunks), framer)))
+        assert cases[0][1]() == cases[1][1]() == planCycle(), "framings parse differently"
+        for name, cycle in cases:
+            results[name + split] = min(timeit.Timer(cycle).repeat(repeat, number)) / number * 1e6
+            results[name + split + "Bytes"] = transientPeak(cycle)
+    return results
+
+
+def benchmarkCapture(path):
+    '''Decoding and change-only publishing of the poll cycles captured by a device
+    (captureFile), in cycles per second, with the values published per cycle'''
+    plans = dict((plan.query, plan) for plan, frame in PLANS)
+    cycles = [{}]
+    for sent, command, latency, reply in readCapture(path):
+        plan = plans.get(command)
+        if plan is None or reply is None:
+            continue
+        if plan in cycles[-1]:
+            cycles.append({}) # Polled again, a new cycle
+        cycles[-1][plan] = reply.encode()
+    if not cycles[-1]:
+        raise ValueError("No polled replies in %s" % path)
+
+    published = malformed = 0
+    lastPublished = {}
+    start = time.perf_counter()
+    for frames in cycles:
+        raw = {}
+        for plan, frame in frames.items():
+            try:
+                raw[plan.key] = plan.parse(frame)
+            except ValueError:
+                malformed += 1
+        for key, value in deriveValues(raw).items():
+            if lastPublished.get(key) != value:
+                lastPublished[key] = value
+                published += 1
+    elapsed = time.perf_counter() - start
+    return {"cycles": len(cycles), "cyclesPerSecond": len(cycles) / elapsed,
+            "publishedPerCycle": float(published) / len(cycles), "malformed": malformed}
+
+
+class LatencyProxy(object):
+    '''TCP proxy delaying every reply of the upstream server by latency seconds,
+    like a slow terminal server: replies are delayed but not serialized'''
+
+    def __init__(self, upstream, latency):
+        self.upstream = upstream
+        self.latency = latency
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("localhost", 0))
+        self.server.listen(16)
+        self.address = self.server.getsockname()
+        self.start(self.accept)
+
+    def start(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            client, address = self.server.accept()
+            server = socket.create_connection(self.upstream)
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            replies = queue.Queue()
+            self.start(self.forward, client, server)
+            self.start(self.receive, server, replies)
+            self.start(self.deliver, replies, client)
+
+    def forward(self, source, destination):
+        try:
+            while True:
+                data = source.recv(4096)
+                if not data:
+                    break
+                destination.sendall(data)
+        except OSError:
+            pass
+        destination.close()
+
+    def receive(self, server, replies):
+        try:
+            while True:
+                data = server.recv(4096)
+                replies.put((time.time() + self.latency, data))
+                if not data:
+                    break
+        except OSError:
+            replies.put((0., b""))
+
+    def deliver(self, replies, client):
+        while True:
+            due, data = replies.get()
+            time.sleep(max(0., due - time.time()))
+            if not data:
+                client.close()
+                break
+            client.sendall(data)
+
+
+def connect(address, timeout=2.0):
+    connection = SeifertXrayConnection("\n", timeout)
+    connection.attach(openSocket(address[0], address[1], timeout))
+    return connection
+
+
+def recover(connection, address, error, deadline):
+    '''Get connection working again after error, like the device does: wait for
+    the late replies after a lost reply, resync after a bad reply, reconnect
+    after the connection was lost or does not get quiet'''
+    if isinstance(error, socket.timeout):
+        connection.settle()
+        return
+    if isinstance(error, ValueError):
+        try:
+            connection.resync()
+            return
+        except OSError:
+            pass
+    while True:
+        try:
+            connection.attach(openSocket(address[0], address[1], connection.timeout))
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def benchmarkPolling(address, duration=3.0, timeout=1.0):
+    '''Poll cycles of all polled parameters per second, one query after the other and pipelined.
+    Cycles failing on a degraded line are counted, and the longest time from a
+    failure to the next good cycle is reported in ms.'''
+    results = {}
+    for name in ("sequential", "pipelined"):
+        connection = connect(address, timeout)
+        batch = b"".join(plan.queryBytes for plan, frame in PLANS)
+        cycles = failed = 0
+        failure = None # Time of the first failure since the last good cycle
+        recovery = 0.
+        end = time.time() + duration
+        while time.time() < end:
+            try:
+                if name == "sequential":
+                    # A frame is only valid until the next exchange
+                    for plan, frame in PLANS:
+                        plan.parse(connection.exchange(plan.queryBytes, 1)[0])
+                else:
+                    for (plan, frame), reply in zip(PLANS, connection.exchange(batch, len(PLANS))):
+                        plan.parse(reply)
+            except (OSError, ValueError) as e:
+                failed += 1
+                failure = failure or time.time()
+                recover(connection, address, e, end + timeout)
+                continue
+            if failure is not None:
+                recovery = max(recovery, time.time() - failure)
+                failure = None
+            cycles += 1
+        connection.socket.close()
+        results[name] = cycles / duration
+        results[name + "Failed"] = failed
+        results[name + "Recovery"] = 1e3 * recovery
+    return results
+
+
+def benchmarkCommandReadback(address, count=50, timeout=1.0):
+    '''Time from sending a current setpoint until the generator reports it, in ms.
+    On a degraded line this includes sending it again until it is read back.'''
+    setpoint = AliasPlan("current.setpoint", "SC:{current.setpoint:02d};;;;")
+    target = AliasPlan("current.target", ";;CN;*{current.target:d};")
+    connection = connect(address, timeout)
+    latencies = []
+    for index in range(count):
+        value = 10 + index % 2 # Alternate, so that every setpoint changes the target
+        start = time.perf_counter()
+        while True:
+            try:
+                connection.send(setpoint.writeBytes(lambda key: value))
+                while target.parse(connection.exchange(target.queryBytes, 1)[0]) // 1000 != value:
+                    pass
+                break
+            except (OSError, ValueError) as e:
+                recover(connection, address, e, time.time() + 10 * timeout)
+        latencies.append(1e3 * (time.perf_counter() - start))
+    connection.socket.close()
+    latencies.sort()
+    return {"median": latencies[len(latencies) // 2], "p95": latencies[int(0.95 * (len(latencies) - 1))],
+            "max": latencies[-1]}
+
+
+def benchmarkSafetyLatency(address, count=50, timeout=1.0):
+    '''Time from an HV:0 command until it is sent while polling continuously, in ms.
+    Before, a lock was held for whole poll cycles; with PriorityLock the poll
+    queries hold it one at a time and the command goes first.'''
+    off = AliasPlan("off", "HV:0;;;;")
+    results = {}
+    for name in ("cycleLock", "priorityLock"):
+        connection = connect(address, timeout)
+        lock = PriorityLock()
+        stop = threading.Event()
+        
+        def poll():
+            while not stop.is_set():
+                if name == "cycleLock":
+                    with lock.hold(POLL):
+                        for plan, frame in PLANS:
+                            connection.exchange(plan.queryBytes, 1)
+                else:
+                    for plan, frame in PLANS:
+                        with lock.hold(POLL):
+                            connection.exchange(plan.queryBytes, 1)
+        
+        poller = threading.Thread(target=poll)
+        poller.start()
+        latencies = []
+        try:
+            for index in range(count):
+                time.sleep(0.005 + 0.01 * (index % 7) / 7) # Land anywhere in a poll cycle
+                start = time.perf_counter()
+                with lock.hold(SAFETY):
+                    connection.send(off.writeBytes(lambda key: None))
+                latencies.append(1e3 * (time.perf_counter() - start))
+        finally:
+            stop.set()
+            poller.join()
+            connection.socket.close()
+        latencies.sort()
+        results[name + "Median"] = latencies[len(latencies) // 2]
+        results[name + "Max"] = latencies[-1]
+    return results
+
+
+def deviceState():
+    '''The per instance state of a GeSeifertXray device with default settings, after some polling.
+    The alias plans are shared by all instances and Karabo itself is not included.'''
+    latency = LatencyRecorder()
+    profiler = PhaseProfiler(100)
+    for plan, frame in PLANS:
+        latency.record(plan.query, 1e-3)
+    history = dict((key, RingBuffer(3600)) for key in ("current.actual", "voltage.actual",
+                                                       "sw.statusWord15", "exposuretimerActual.totalSec"))
+    return (SeifertXrayConnection(), latency, profiler, history, ExposureCountdown(),
+            dict(decodeCycle()), dict(decodeCycle()))
+
+
+def benchmarkMemory(instances=20):
+    '''Memory allocated per device instance, in kB'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    states = [deviceState() for index in range(instances)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {"perInstance": allocated / 1024. / instances}
+
+
+# Metrics where a higher value is better, all others are better lower
+HIGHER_IS_BETTER = ("polling.sequential", "polling.pipelined", "capture.cyclesPerSecond")
+
+
+def compare(results, baseline, tolerance):
+    '''Return the regressions of results with respect to baseline, as messages'''
+    regressions = []
+    for case, metrics in baseline["results"].items():
+        for metric, reference in metrics.items():
+            name = "%s.%s" % (case, metric)
+            value = results["results"].get(case, {}).get(metric)
+            if value is None or not reference:
+                continue
+            change = (value - reference) / reference
+            if name not in HIGHER_IS_BETTER:
+                change = -change
+            if change < -tolerance:
+                regressions.append("%s: %.4g, baseline %.4g (%+.0f%%)" % (name, value, reference,
+                                                                        100 * (value - reference) / reference))
+    return regressions
+
+
+def startSimulator(port, faults=None):
+    '''Start SeifertXrayHwSimulator, with the faults file if any, and wait until it accepts connections'''
+    command = [sys.executable, SIMULATOR, "--port", str(port), "--log-level", "ERROR"]
+    if faults:
+        command += ["--faults", faults]
+    simulator = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 5
+    while True:
+        try:
+            socket.create_connection(("localhost", port), 0.5).close()
+            return simulator
+        except OSError:
+            if time.time() > deadline or simulator.poll() is not None:
+                simulator.kill()
+                raise RuntimeError("The simulator did not start")
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the GeSeifertXray device")
+    parser.add_argument("--simulator", default="localhost:10001",
+                        help="address of a running simulator (default %(default)s)")
+    parser.add_argument("--start-simulator", action="store_true", help="start the simulator on the port of --simulator")
+    parser.add_argument("--no-simulator", action="store_true", help="only run the benchmarks which need no simulator")
+    parser.add_argument("--latency", type=float, default=0., help="latency injected into every reply, in ms")
+    parser.add_argument("--faults", help="fault configuration for the simulator started by --start-simulator")
+    parser.add_argument("--timeout", type=float, default=1., help="reply timeout, in s (default %(default)s)")
+    parser.add_argument("--capture", help="also decode the poll cycles of this capture file of a device")
+    parser.add_argument("--duration", type=float, default=3., help="duration of the polling benchmarks, in s")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative change flagged as regression (default %(default)s)")
+    args = parser.parse_args()
+
+    results = {"statusDecode": benchmarkStatusDecode(), "aliasPlans": benchmarkAliasPlans(),
+               "decode": benchmarkDecode(), "statusTables": benchmarkStatusTables(),
+               "framing": benchmarkFraming(), "memory": benchmarkMemory()}
+    if args.capture:
+        results["capture"] = benchmarkCapture(args.capture)
+    if not args.no_simulator:
+        host, port = args.simulator.rsplit(":", 1)
+        simulator = startSimulator(int(port), args.faults) if args.start_simulator else None
+        try:
+            address = (host, int(port))
+            if args.latency > 0:
+                address = LatencyProxy(address, args.latency / 1000.).address
+            results["polling"] = benchmarkPolling(address, args.duration, args.timeout)
+            results["commandReadback"] = benchmarkCommandReadback(address, timeout=args.timeout)
+            results["safetyLatency"] = benchmarkSafetyLatency(address, timeout=args.timeout)
+        finally:
+            if simulator is not None:
+                simulator.terminate()
+                simulator.wait()
+
+    report = {"results": results, "latency": args.latency, "faults": args.faults, "python": platform.python_version(),
+              "host": platform.node(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,134 @@
 __author__="gabriele.giambartolomei@desy.de"
 __date__ ="June, 2015, 10:56 AM"
-__copyright__="Copyright (c) 2010-2015 European XFEL GmbH Hamburg. All rights reserved."
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
 
+'''Tests of the GeSeifertXray device code which runs without Karabo'''
+
+import os
+import sys
+import threading
+import time
 import unittest
-# Add here needed imports
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SeifertXrayConfirmed import ConfirmedSetpoints
+from SeifertXrayCountdown import ExposureCountdown
+from SeifertXrayMetrics import RingBuffer
+from SeifertXrayPriority import POLL, SAFETY, SETPOINT, PriorityLock
+from SeifertXrayStatus import interlockFault, statusWord12Message
+from SeifertXrayValues import deriveValues
 
 
 class  GeSeifertXrayTestCase(unittest.TestCase):
-    #def setUp(self):
-    #    self.foo = GeSeifertXray()
-    #
 
-    #def tearDown(self):
-    #    self.foo.dispose()
-    #    self.foo = None
+    def test_interlockFault(self):
+        self.assertIsNone(interlockFault({}))
+        self.assertIsNone(interlockFault({"statusMassage.statusWord12": 76, "sw.statusWord1": 64}))
+        self.assertEqual(interlockFault({"statusMassage.statusWord12": 46}), "EMERGENCY-STOP (code 46)")
+        self.assertEqual(interlockFault({"statusMassage.statusWord12": 112}), "Shutter safety circuit open (code 112)")
+        self.assertEqual(interlockFault({"sw.statusWord1": 64 | 32}), "Cooling circuit not OK")
+        # The Status Word 12 code is reported first
+        self.assertEqual(interlockFault({"statusMassage.statusWord12": 33, "sw.statusWord1": 32}),
+                         "%s (code 33)" % statusWord12Message(33))
+
+    def test_statusWord12Message(self):
+        self.assertEqual(statusWord12Message(46), "EMERGENCY-STOP")
+        self.assertEqual(statusWord12Message(118), "Push START button")
+        self.assertEqual(statusWord12Message(999), "Unknown message 999")
+
+    def test_deriveValues(self):
+        derived = deriveValues({"current.target": 17000, "current.actual": 16999,
+                                "voltage.target": 40000, "voltage.actual": 40100,
+                                "exposuretimerActual.totalSec": 3723,
+                                "sw.statusWord1": 64 | 32,
+                                "statusMassage.statusWord12": 46})
+        self.assertEqual(derived["current.target"], 17)
+        self.assertEqual(derived["current.actual"], 16999)
+        self.assertEqual(derived["current.actual_milli"], 16)
+        self.assertEqual(derived["voltage.target"], 40)
+        self.assertEqual(derived["voltage.actual_kilo"], 40)
+        self.assertEqual((derived["exposuretimerActual.hours"], derived["exposuretimerActual.minutes"],
+                          derived["exposuretimerActual.seconds"]), (1, 2, 3))
+        self.assertEqual(derived["sw.statusWord1Bin"], "01100000")
+        self.assertEqual(derived["highVoltageStatus"], "ON")
+        self.assertEqual(derived["coolingCircuit"], "NOT OK")
+        self.assertEqual(derived["extComputerControl"], "OFF")
+        self.assertEqual(derived["statusMassage.statusWord12Str"], "EMERGENCY-STOP")
+        # Only what was polled is derived
+        self.assertEqual(deriveValues({"warmup.timeleft": 5}), {"warmup.timeleft": 5})
+
+    def test_ExposureCountdown(self):
+        countdown = ExposureCountdown()
+        self.assertTrue(countdown.syncDue(0., 1.))
+        self.assertIsNone(countdown.sync(60, 0.))
+        self.assertEqual(countdown.predict(10.), 60) # Not running
+
+        self.assertTrue(countdown.setRunning(True))
+        self.assertFalse(countdown.setRunning(True))
+        self.assertTrue(countdown.syncDue(0., 5.)) # A change needs a sync
+        self.assertIsNone(countdown.sync(60, 100.))
+        self.assertFalse(countdown.syncDue(104., 5.))
+        self.assertTrue(countdown.syncDue(105., 5.))
+        self.assertEqual(countdown.predict(110.5), 50)
+        self.assertEqual(countdown.predict(1000.), 0)
+        # Predicted 50.5 at 109.5, measured 50
+        self.assertAlmostEqual(countdown.sync(50, 109.5), 0.5)
 
-    def test_GeSeifertXray(self):
-        #assert x != y;
-        #self.assertEqual(x, y, "Msg");
-        self.fail("TODO: Write unit test")
+    def test_ConfirmedSetpoints(self):
+        confirmed = ConfirmedSetpoints()
+        taken = confirmed.taken(100.)
+        confirmed.confirm("current.setpoint", 17, taken)
+        self.assertTrue(confirmed.holds("current.setpoint", 17, 101., 2.))
+        self.assertFalse(confirmed.holds("current.setpoint", 18, 101., 2.))
+        # The readback went stale, e.g. changed on the keypad since
+        self.assertFalse(confirmed.holds("current.setpoint", 17, 102.5, 2.))
+
+        # A poll queried before a write brings the old value back after it
+        stale = confirmed.taken(103.)
+        confirmed.written("current.setpoint")
+        confirmed.confirm("current.setpoint", 17, stale)
+        self.assertFalse(confirmed.holds("current.setpoint", 17, 103.5, 2.))
+        confirmed.confirm("current.setpoint", 20, confirmed.taken(104.))
+        self.assertTrue(confirmed.holds("current.setpoint", 20, 104.5, 2.))
+        confirmed.clear()
+        self.assertFalse(confirmed.holds("current.setpoint", 20, 104.5, 2.))
+
+    def test_RingBuffer(self):
+        ring = RingBuffer(3)
+        self.assertEqual(ring.statistics(10., 0.), [])
+        for timestamp in range(5):
+            ring.append(float(timestamp), timestamp * 10.)
+        # The oldest values 0 and 10 were overwritten
+        self.assertEqual(sorted(ring.window(100., 4.)), [20., 30., 40.])
+        self.assertEqual(sorted(ring.window(1., 4.)), [30., 40.])
+        minimum, maximum, mean, std = ring.statistics(100., 4.)
+        self.assertEqual((minimum, maximum, mean), (20., 40., 30.))
+        self.assertAlmostEqual(std, (200. / 3) ** 0.5)
+
+    def test_PriorityLock(self):
+        lock = PriorityLock()
+        order = []
+        lock.acquire(POLL)
+
+        def waiter(level, name):
+            with lock.hold(level):
+                order.append(name)
+
+        threads = []
+        for level, name in ((POLL, "poll 1"), (SETPOINT, "setpoint"), (POLL, "poll 2"), (SAFETY, "safety")):
+            threads.append(threading.Thread(target=waiter, args=(level, name)))
+            threads[-1].start()
+            # Queue them in this order
+            while sum(lock.depth) < len(threads):
+                time.sleep(0.001)
+        lock.release()
+        for thread in threads:
+            thread.join(5.)
+        self.assertEqual(order, ["safety", "setpoint", "poll 1", "poll 2"])
+        levels, depth, maxDepth, p99, maximum = lock.statistics()
+        self.assertEqual(depth, [0, 0, 0])
+        self.assertEqual(maxDepth, [1, 1, 2])
 
 if __name__ == '__main__':
     unittest.main()
-
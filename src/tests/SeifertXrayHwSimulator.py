@@ -1,231 +1,500 @@
-import socket
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Simulator of the Seifert X-ray generator, for testing GeSeifertXray without hardware.
+
+Commands are newline terminated lines. Queries are answered like the
+generator does, "*" followed by the value, write commands get no reply.
+Every client connection simulates a generator of its own, so that many
+devices can be load tested against one simulator:
+
+    python SeifertXrayHwSimulator.py --port 10001 --log-level DEBUG
+
+A serial line is degraded with --faults, a JSON file like
+SeifertXrayHwSimulator_faults.json. It holds a list of phases, each lasting
+"duration" seconds (the last one forever, or start over with "repeat").
+A phase has the "default" behaviour and "commands" ones for a command
+("SR:01") or all commands of a name ("SR"):
+
+    latency    seconds before the command is processed, a number or
+               {"distribution": "uniform", "low": .., "high": ..},
+               {"distribution": "normal", "mean": .., "stddev": ..},
+               {"distribution": "exponential", "mean": ..} or
+               {"distribution": "lognormal", "mu": .., "sigma": ..}
+    jitter     up to this many seconds added to or removed from the latency
+    drop       probability that the reply is not sent
+    garble     probability that the "*" is missing or a digit is replaced
+    truncate   probability that the reply is cut short
+    reset      probability that the connection is reset instead
+    drip       seconds between the bytes of the reply
+
+The generator is a time-stepped model: the actual current and voltage follow
+their targets, the exposure timer counts down, the shutter moves with a
+delay, the water flow is noisy, the warm-up progresses and faults switch
+the high voltage off. Its parameters, see MODEL, can be changed with a
+JSON file given to --model.
+
+With --replay the replies captured by GeSeifertXray (captureFile) are served
+instead, in real time or --speed times faster. At --speed 0 every query
+gets the next captured reply, for reproducing exact reply sequences.'''
+
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import random
 import sys
+import time
 
-# Create a TCP/IP socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-#Then bind() is used to associate the socket with the server address.
-#In this case, the address is localhost, referring to the current server, and the port number is 10001.
-# Bind the socket to the port
-server_address = ('localhost', 10001)
-print ("starting up on %s port %s") % server_address
-sock.bind(server_address)
-
-#Calling listen() puts the socket into server mode, and accept() waits for an incoming connection.
-# Listen for incoming connections
-sock.listen(1)
-
-while True:
-    # Wait for a connection
-    print >>sys.stderr, 'waiting for a connection'
-    connection, client_address = sock.accept()
-
-    #accept() returns an open connection between the server and client, along with the address of the client.
-    #The connection is actually a different socket on another port (assigned by the kernel).
-    #Data is read from the connection with recv() and transmitted with sendall().
-    #When communication with a client is finished, the connection needs to be cleaned up using close().
-    #This example uses a try:finally block to ensure that close() is always called, even in the event of an error.
-    try:
-        print ("connection from", client_address)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-        reply = ""
-        command = ""
-        currentTarget = "*0000017000\n"
-        currentActual = "*0000017000\n"
-        voltageTarget = "*0000019000\n"
-        voltageActual = "*0000019000\n"
+from SeifertXrayTransport import readCapture
 
-        exposureTimerSec = "*0000045246\n"
+log = logging.getLogger("SeifertXrayHwSimulator")
 
-        statusWord12Code = "*0000000076\n" #Shutter not connected
-        statusWord1 = "*0000000032\n" #0100 0000 Bit6=1 High Voltage ON
-        statusWord2 = "*0000000032\n"
-        statusWord3 = "*0000000016\n"
-        statusWord4 = "*0000000008\n"
-        statusWord6 = "*0000000004\n"
-        statusWord14 = "*0000000100\n" #Water flow rate operating point
-        statusWord15 = "*0000000090\n" #Current Water flow rate point
 
-        warmUpTimeLeft = "*0000000999\n"
-        anodeMaterial = "*Co\n"
+# Parameters of the model of the generator, can be changed with --model
+MODEL = {
+    "stepInterval": 0.001, # s, the model is not stepped more often
+    "currentTau": 0.5, # s, time constant of the current regulation
+    "voltageTau": 1.0, # s, time constant of the voltage regulation
+    "nominalTolerance": 0.02, # Relative deviation of the actual values still "nominal"
+    "shutterDelay": 0.3, # s from OS:3/CS:3 until the shutter reports its new position
+    "waterFlow": 220., # Hz, nominal water flow rate, above the minimum of status word 14
+    "waterFlowNoise": 1.5, # Hz, standard deviation of the water flow rate
+    "warmupDurations": {"1": 600, "2": 900, "3": 1800, "4": 900}, # s for each non-operative interval
+    "faultRate": 0., # Status word 12 fault events per hour, while high voltage is on
+    "faultCodes": [33, 39, 55, 90, 112], # Drawn for the fault events
+}
 
-        focus = "*0.15 x 8 mm\n"            
 
-        # Receive the data in small chunks and retransmit it
-        while True:
-            data = connection.recv(16)                                                        
-            
-            if data:
-                #Here we have to consider all commands received from the Karabo device regardless of their parameters
-                command = data[:2]
-
-                # HIGH VOLTAGE
-                if command == "HV":
-                    print ("\n\nReceived %s") % data
-                    if (data.rstrip() == "HV:1"):
-                        print "High Voltage ON"
-                        statusWord1 = "*0000000064\n"
-                    elif (data.rstrip() == "HV:0"):
-                        print "High Voltage OFF"
-                        statusWord1 = "*0000000032\n"
-
-                #CURRENT SETPOINT
-                elif command == "SC":
-                    print ("\n\nReceived %s") % data                    
-                    currentTarget = "*00000"+data[3:5]+"000\n"
-                    currentActual = currentTarget
-                    print currentTarget, currentActual
-                    print ("Setting Current Target to %s and Actual Current to %s" % (currentTarget, currentActual))
-
-                elif command == "CN":
-                    print ("\n\nReceived %s") % data                    
-                    reply = currentTarget
-                    print ("Sending Current Target Setpoint %s") % reply
-                    
-                elif command == "CA":
-                    print ("\n\nReceived %s") % data                    
-                    reply = currentActual
-                    print ("Sending Current Actual Setpoint %s") % reply
-
-                #VOLTAGE SETPOINT
-                elif command == "SV":
-                    print ("\n\nReceived %s") % data                    
-                    voltageTarget = "*00000"+data[3:5]+"000\n"
-                    voltageActual = voltageTarget
-                    print ("Setting Voltage Target to %s and Actual Voltage to %s" % (voltageTarget.rstrip(), voltageActual.rstrip())) 
-
-                elif command == "VN":
-                    print ("\n\nReceived %s") % data                    
-                    reply = voltageTarget
-                    print ("Sending Voltage Target Setpoint %s") % reply
-
-                elif command == "VA":
-                    print ("\n\nReceived %s") % data                    
-                    reply = voltageActual
-                    print ("Sending Voltage Actual Setpoint %s") % reply
-
-                #EXPOSURE TIMERS
-                elif command == "TN":
-                    print ("\n\nReceived %s") % data                    
-                    reply = exposureTimerSec
-                    print ("Sending Exposure Timer 3 Setpoint value (sec) %s") % reply
-
-                elif command == "TP":
-                    print ("\n\nReceived %s") % data
-                    print ("Setting Exposure Timer3 values...")
-                    values = data.split(",")
-                    hhSec = int(values[1]) * 3600
-                    mmSec = int(values[2]) * 60
-                    ss = int(values[3])                   
-                    #exposureTimerSec = str(hhSec + mmSec + ss)+"\n"
-                    print ("Esposure Timer3 %s hh, %s mm, %s ss") % values[1] % values[2] % values[3]
-                     
-                elif command == "TS":
-                    print ("\n\nReceived %s") % data
-                    print ("Setting Exposure Timer 3 ON...")
-                       
-                elif command == "TE":
-                    print ("\n\nReceived %s") % data
-                    print ("Setting Exposure Timer 3 OFF...")
-
-                elif command == "TA":
-                    print ("\n\nReceived %s") % data                    
-                    reply = exposureTimerSec
-                    print ("Sending Exposure Timer3 value (sec) %s") % reply
-                    
-
-                elif command == "SR":
-                    if (data.rstrip() == "SR:12"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord12Code
-                        print ("Sending Status Word 12 code %s") % reply
-                    elif (data.rstrip() == "SR:01"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord1
-                        print ("Sending Status Word 1 %s") % reply
-                    elif (data.rstrip() == "SR:02"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord2
-                        print ("Sending Status Word 2 %s") % reply
-                    elif (data.rstrip() == "SR:03"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord3
-                        print ("Sending Status Word 3 %s") % reply
-                    elif (data.rstrip() == "SR:04"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord4
-                        print ("Sending Status Word 4 %s") % reply
-                    elif (data.rstrip() == "SR:06"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord6
-                        print ("Sending Status Word 6 %s") % reply
-                    elif (data.rstrip() == "SR:14"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord14
-                        print ("Sending Status Word 14 %s") % reply
-                    elif (data.rstrip() == "SR:15"):
-                        print ("\n\nReceived %s") % data                        
-                        reply = statusWord15
-                        print ("Sending Status Word 15 %s") % reply
-                        
-
-                elif command == "SW":
-                    print ("\n\nReceived %s") % data                    
-                    values = data.split(":")
-                    flowRate = values[2]
-                    statusWord14 = "*0000000"+flowRate[4]
-                    print ("Setting Water Flow rate %s") % values[2]
-                    
-                elif command == "CL":
-                    print ("\n\nReceived %s") % data
-                    print ("Acknowledge Error (does nothing)...")
-                    
-                elif command == "WU":
-                    print ("\n\nReceived %s") % data
-                    print ("Setting Warm-up Program... (does nothing)")
-                    
-                elif command == "WT":
-                    print ("\n\nReceived %s") % data                    
-                    reply = warmUpTimeLeft
-                    print ("Sending Warm-up time left %s") % reply
-
-                elif command == "KB":
-                    print ("\n\nReceived %s") % data
-                    if (data.rstrip() == "KB:0"):
-                        print ("Keypad DISABLED!")
-                    elif (data.rstrip() == "KB:1"):
-                        print ("Keypad ENABLED!")  
-                          
-                elif command == "FR":
-                    print ("\n\nReceived %s") % data
-                    reply = focus
-                    print ("Sending focus ASCII String %s") % focus                    
-
-                elif command == "MR":
-                    print ("\n\nReceived %s") % data                    
-                    reply = anodeMaterial
-                    print ("Send Anode material %s ") % reply
-
-                elif command == "CC":
-                    print ("\n\nReceived %s") % data
-                    print ("Beam Shutter Control (does nothing)...")
-                         
-                elif command == "OS":
-                    print ("\n\nReceived %s") % data
-                    print ("Open Beam Shutter...")
-
-                elif command == "CS":
-                    print ("\n\nReceived %s") % data
-                    print ("Close Beam Shutter...")        
-
-                #Eventually send reply to client device
-                connection.sendall(reply)
+class SimulatedGenerator(object):
+    '''Model of one generator, stepped to the current time before every command'''
+
+    def __init__(self, model=None, rng=None):
+        self.model = dict(MODEL, **(model or {}))
+        self.random = rng or random.Random()
+        self.lastStep = time.time()
+        self.replyDelay = 0. # s to wait before sending the last reply
+
+        self.currentTarget = 17000 # uA
+        self.currentActual = 0.
+        self.voltageTarget = 19000 # V
+        self.voltageActual = 0.
+        self.exposureTimerTarget = 45246 # s
+        self.exposureTimerActual = 45246
+        self.timerStart = self.lastStep # Exposure timer 3 runs from the start
+        self.statusWords = {
+            1: 0, # Bit 64 high voltage on
+            2: 32, # Bit 32 timer 3 on
+            3: 16,
+            4: 8, # Bit 128 shutter 3 command, bit 64 shutter 3 open
+            6: 4, # Bit 8 warm-up program active
+            12: 76, # Stand-by
+            14: 100, # Minimum water flow rate
+            15: 220, # Water flow rate actual
+        }
+        self.shutterMoves = [] # (time, open) of the shutter 3 positions to come
+        self.warmupEnd = None
+        self.warmupInterval = 0
+        self.warmupVoltage = 0
+        self.warmupTimeLeft = 0
+        self.focus = "0.15 x 8 mm"
+        self.anodeMaterial = "Co"
+        self.keypadEnabled = True
+
+        # Query -> value, without the "*" of the reply
+        self.queries = {
+            "CN": lambda: self.currentTarget,
+            "CA": lambda: int(round(self.currentActual)),
+            "VN": lambda: self.voltageTarget,
+            "VA": lambda: int(round(self.voltageActual)),
+            "TN:3": lambda: self.exposureTimerTarget,
+            "TA:3": lambda: self.exposureTimerActual,
+            "WT": lambda: self.warmupTimeLeft,
+            "FR": lambda: self.focus,
+            "MR": lambda: self.anodeMaterial,
+        }
+        for word in self.statusWords:
+            self.queries["SR:%02d" % word] = lambda word=word: self.statusWords[word]
+
+        # Write command -> method taking the arguments after ":"
+        self.writes = {
+            "HV": self.setHighVoltage,
+            "SC": self.setCurrent,
+            "SV": self.setVoltage,
+            "TP": self.setExposureTimer,
+            "TS": self.startExposureTimer,
+            "TE": self.stopExposureTimer,
+            "SW": self.setStatusWord,
+            "CL": self.clearMessage,
+            "WU": self.startWarmup,
+            "KB": self.setKeypad,
+            "CC": self.setShutterControl,
+            "OS": self.openShutter,
+            "CS": self.closeShutter,
+        }
+
+    def handle(self, command, now=None):
+        ''' Execute a command, return its reply without terminator, None for a write command '''
+        self.now = time.time() if now is None else now
+        self.step(self.now)
+
+        query = self.queries.get(command)
+        if query is not None:
+            value = query()
+            if isinstance(value, int):
+                return "*%010d" % value
+            return "*" + value
+
+        name, separator, arguments = command.partition(":")
+        write = self.writes.get(name)
+        if write is None:
+            log.warning("Unknown command %r", command)
+            return None
+        try:
+            write(arguments)
+        except (ValueError, IndexError) as e:
+            log.warning("Malformed command %r: %s", command, e)
+        return None
 
+    @property
+    def highVoltage(self):
+        return bool(self.statusWords[1] & 64)
+
+    def step(self, now):
+        ''' Advance the model to now '''
+        model = self.model
+        dt = now - self.lastStep
+        if dt < model["stepInterval"]:
+            return # Commands of one poll cycle see the same state
+        self.lastStep = now
+
+        # Warm-up drives the voltage up to the test voltage
+        if self.warmupEnd is not None:
+            self.warmupTimeLeft = max(0, int(math.ceil(self.warmupEnd - now)))
+            if self.warmupTimeLeft == 0:
+                self.warmupEnd = None
+                self.voltageTarget = self.warmupVoltage
+                self.statusWords[6] &= ~8
             else:
-                print ("no more data from", client_address)
-                break
-                
+                duration = model["warmupDurations"][str(self.warmupInterval)]
+                self.voltageTarget = int(self.warmupVoltage * (1. - float(self.warmupTimeLeft) / duration))
+
+        # First order regulation towards the targets, down to 0 without high voltage
+        on = self.highVoltage
+        for actual, target, tau in (("currentActual", self.currentTarget, model["currentTau"]),
+                                    ("voltageActual", self.voltageTarget, model["voltageTau"])):
+            goal = target if on else 0.
+            value = getattr(self, actual)
+            setattr(self, actual, goal + (value - goal) * math.exp(-dt / tau))
+        for mask, actual, target in ((8, self.currentActual, self.currentTarget),
+                                     (4, self.voltageActual, self.voltageTarget)):
+            if on and abs(actual - target) > model["nominalTolerance"] * target:
+                self.statusWords[1] |= mask
+            else:
+                self.statusWords[1] &= ~mask
+
+        # Exposure timer 3 counts down while on, the shutter closes when it expires
+        if self.statusWords[2] & 32:
+            self.exposureTimerActual = max(0, self.exposureTimerTarget - int(now - self.timerStart))
+            if self.exposureTimerActual == 0:
+                self.statusWords[2] &= ~32
+                self.closeShutter("3")
+
+        while self.shutterMoves and self.shutterMoves[0][0] <= now:
+            moveTime, opened = self.shutterMoves.pop(0)
+            if opened:
+                self.statusWords[4] |= 64
+            else:
+                self.statusWords[4] &= ~64
+
+        # The flow depends on the cooling water supply, not on its minimum
+        flow = self.random.gauss(model["waterFlow"], model["waterFlowNoise"])
+        self.statusWords[15] = min(250, max(0, int(round(flow))))
+
+        # Faults switch the high voltage off until acknowledged
+        if on and model["faultRate"] > 0 and self.random.random() < 1. - math.exp(-model["faultRate"] * dt / 3600.):
+            code = self.random.choice(model["faultCodes"])
+            log.info("Fault event %d", code)
+            self.statusWords[12] = code
+            self.statusWords[1] &= ~64
+            if code == 33:
+                self.statusWords[1] |= 32 # Cooling circuit not OK
+
+    def setHighVoltage(self, arguments):
+        if arguments == "1":
+            self.statusWords[1] |= 64
+        elif arguments == "0":
+            self.statusWords[1] &= ~64
+
+    def setCurrent(self, arguments):
+        self.currentTarget = int(arguments) * 1000
+
+    def setVoltage(self, arguments):
+        self.voltageTarget = int(arguments) * 1000
+
+    def setExposureTimer(self, arguments):
+        timer, hours, minutes, seconds = arguments.split(",")
+        self.exposureTimerTarget = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+    def startExposureTimer(self, arguments):
+        self.statusWords[2] |= 32
+        self.exposureTimerActual = self.exposureTimerTarget
+        self.timerStart = self.now
+
+    def stopExposureTimer(self, arguments):
+        self.statusWords[2] &= ~32
+
+    def setStatusWord(self, arguments):
+        word, value = arguments.split(":")
+        self.statusWords[int(word)] = int(value)
+
+    def clearMessage(self, arguments):
+        self.statusWords[12] = 0
+        self.statusWords[1] &= ~32
+
+    def startWarmup(self, arguments):
+        interval, voltage = arguments.split(",")
+        if interval == "0":
+            self.warmupEnd = None
+            self.warmupTimeLeft = 0
+            self.statusWords[6] &= ~8
+            return
+        if interval not in self.model["warmupDurations"]:
+            raise ValueError("no warm-up interval %s" % interval)
+        self.warmupInterval = int(interval)
+        self.warmupVoltage = int(voltage) * 1000
+        self.warmupEnd = self.now + self.model["warmupDurations"][interval]
+        self.warmupTimeLeft = self.model["warmupDurations"][interval]
+        self.statusWords[6] |= 8
+
+    def setKeypad(self, arguments):
+        self.keypadEnabled = arguments == "1"
+
+    def setShutterControl(self, arguments):
+        pass
+
+    def openShutter(self, arguments):
+        self.statusWords[4] |= 128
+        self.shutterMoves.append((self.now + self.model["shutterDelay"], True))
+
+    def closeShutter(self, arguments):
+        self.statusWords[4] &= ~128
+        self.shutterMoves.append((self.now + self.model["shutterDelay"], False))
+
+
+class ReplayedGenerator(object):
+    '''Replies of a captured session instead of the model. At speed 0 every query
+    gets the next captured reply of the same command, starting over at the end.
+    Otherwise it gets the reply captured last before the replay clock, which
+    runs speed times faster than real time, delayed by its captured latency.'''
+
+    def __init__(self, replies, speed):
+        self.replies = replies # command -> (sent times, (latency, reply) list), see loadReplies
+        self.speed = speed
+        self.start = time.time()
+        self.positions = dict.fromkeys(replies, 0)
+        self.replyDelay = 0.
+
+    @staticmethod
+    def loadReplies(path):
+        ''' Return the captured replies of path by command '''
+        replies = {}
+        for sent, command, latency, reply in readCapture(path):
+            if latency is None:
+                continue # Write command
+            times, entries = replies.setdefault(command, ([], []))
+            times.append(sent)
+            entries.append((latency, reply))
+        return replies
+
+    def handle(self, command, now=None):
+        ''' Return the captured reply to command, None for a write command or a lost reply '''
+        self.replyDelay = 0.
+        if command not in self.replies:
+            return None
+        times, entries = self.replies[command]
+        if self.speed > 0:
+            clock = ((time.time() if now is None else now) - self.start) * self.speed
+            latency, reply = entries[max(0, bisect.bisect_right(times, clock) - 1)]
+            if reply is not None:
+                self.replyDelay = latency / self.speed
+        else:
+            latency, reply = entries[self.positions[command] % len(entries)]
+            self.positions[command] += 1
+        return reply
+
+
+class FaultInjector(object):
+    '''Degradation of the serial line, following the phases of a fault configuration'''
+
+    def __init__(self, configuration, seed=None):
+        self.phases = configuration.get("phases", [configuration])
+        self.repeat = configuration.get("repeat", False)
+        self.random = random.Random(configuration.get("seed", seed))
+        self.start = time.time()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as config:
+            return cls(json.load(config))
+
+    def phase(self):
+        ''' Return the phase in effect now '''
+        elapsed = time.time() - self.start
+        total = sum(phase.get("duration", 0) for phase in self.phases)
+        if self.repeat and total > 0:
+            elapsed %= total
+        for phase in self.phases[:-1]:
+            elapsed -= phase.get("duration", 0)
+            if elapsed < 0:
+                return phase
+        return self.phases[-1]
+
+    def behaviour(self, command):
+        ''' Return the behaviour for command in the current phase '''
+        phase = self.phase()
+        commands = phase.get("commands", {})
+        behaviour = dict(phase.get("default", {}))
+        behaviour.update(commands.get(command.partition(":")[0], {}))
+        behaviour.update(commands.get(command, {}))
+        return behaviour
+
+    def happens(self, behaviour, fault):
+        return self.random.random() < behaviour.get(fault, 0.)
+
+    def latency(self, behaviour):
+        ''' Return the latency drawn from the distribution of behaviour, with its jitter '''
+        latency = behaviour.get("latency", 0.)
+        if isinstance(latency, dict):
+            distribution = latency.get("distribution", "constant")
+            if distribution == "uniform":
+                latency = self.random.uniform(latency["low"], latency["high"])
+            elif distribution == "normal":
+                latency = self.random.gauss(latency["mean"], latency["stddev"])
+            elif distribution == "exponential":
+                latency = self.random.expovariate(1. / latency["mean"])
+            elif distribution == "lognormal":
+                latency = self.random.lognormvariate(latency["mu"], latency["sigma"])
+            else:
+                latency = latency["value"]
+        jitter = behaviour.get("jitter", 0.)
+        return max(0., latency + self.random.uniform(-jitter, jitter))
+
+    def corrupt(self, reply, behaviour):
+        ''' Return reply, garbled or truncated as configured '''
+        if reply and self.happens(behaviour, "garble"):
+            if self.random.random() < 0.5 or len(reply) < 2:
+                reply = reply.lstrip("*")
+            else:
+                position = self.random.randrange(1, len(reply))
+                reply = reply[:position] + self.random.choice("?#x ") + reply[position + 1:]
+        if reply and self.happens(behaviour, "truncate"):
+            reply = reply[:self.random.randrange(len(reply))]
+        return reply
+
+
+async def sendReply(writer, data, drip):
+    if drip > 0:
+        for index in range(len(data)):
+            writer.write(data[index:index + 1])
+            await writer.drain()
+            await asyncio.sleep(drip)
+    else:
+        writer.write(data)
+        await writer.drain()
+
+
+async def serveClient(reader, writer, faults=None, model=None, rng=None, replay=None):
+    ''' Simulate a generator for one client until it disconnects, or replay
+    the (replies, speed) of a capture. Commands are processed one after the
+    other, like on a serial line. '''
+    peer = writer.get_extra_info("peername")
+    log.info("Connection from %s", peer)
+    if replay is not None:
+        generator = ReplayedGenerator(*replay)
+    else:
+        generator = SimulatedGenerator(model, random.Random(rng.random()) if rng is not None else None)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line.endswith(b"\n"):
+                break # Disconnected, maybe in the middle of a command
+            command = line.decode("ascii", "replace").strip()
+            if not command:
+                continue
+            behaviour = faults.behaviour(command) if faults is not None else {}
+            if behaviour:
+                latency = faults.latency(behaviour)
+                if latency > 0:
+                    await asyncio.sleep(latency)
+                if faults.happens(behaviour, "reset"):
+                    log.info("%s: %s -> connection reset", peer, command)
+                    writer.transport.abort()
+                    return
+            reply = generator.handle(command)
+            if generator.replyDelay > 0:
+                await asyncio.sleep(generator.replyDelay)
+            if reply is not None and behaviour:
+                if faults.happens(behaviour, "drop"):
+                    log.debug("%s: %s -> reply dropped", peer, command)
+                    continue
+                reply = faults.corrupt(reply, behaviour)
+            log.debug("%s: %s -> %s", peer, command, reply)
+            if reply is not None:
+                await sendReply(writer, reply.encode("ascii", "replace") + b"\n", behaviour.get("drip", 0.))
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+        log.warning("Connection from %s failed: %s", peer, e)
     finally:
-        # Clean up the connection
-        connection.close()    
+        log.info("Connection from %s closed", peer)
+        writer.close()
+
+
+async def serve(host, port, faults=None, model=None, seed=None, replay=None):
+    ''' Serve clients on host:port until cancelled, degraded by the FaultInjector faults.
+    model changes parameters of MODEL, seed makes the generators reproducible,
+    replay is the (replies, speed) of a capture to serve instead of the model. '''
+    rng = random.Random(seed)
+    server = await asyncio.start_server(
+        lambda reader, writer: serveClient(reader, writer, faults, model, rng, replay),
+        host, port, backlog=1024)
+    log.info("Simulator listening on %s port %d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulator of the Seifert X-ray generator")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=10001)
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--faults", help="JSON file of the faults to inject")
+    parser.add_argument("--model", help="JSON file of the model parameters to change")
+    parser.add_argument("--seed", type=int, help="seed of the random numbers of the model")
+    parser.add_argument("--replay", help="capture file of GeSeifertXray to replay instead of the model")
+    parser.add_argument("--speed", type=float, default=1.,
+                        help="replay speed, 0 = every query gets the next captured reply (default %(default)s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    faults = FaultInjector.load(args.faults) if args.faults else None
+    model = None
+    if args.model:
+        with open(args.model) as config:
+            model = json.load(config)
+    replay = None
+    if args.replay:
+        replay = (ReplayedGenerator.loadReplies(args.replay), args.speed)
+        log.info("Replaying %d commands of %s", len(replay[0]), args.replay)
+    try:
+        asyncio.run(serve(args.host, args.port, faults, model, args.seed, replay))
+    except KeyboardInterrupt:
+        pass
+
 
+if __name__ == "__main__":
+    main()
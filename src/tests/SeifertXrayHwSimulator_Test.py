@@ -0,0 +1,90 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Tests of the degradation of the serial line by the simulator'''
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from SeifertXrayHwSimulator import FaultInjector, SimulatedGenerator
+
+
+class FaultInjectorTestCase(unittest.TestCase):
+
+    def test_behaviour(self):
+        faults = FaultInjector({"default": {"latency": 0.1, "drop": 0.5},
+                                "commands": {"SR": {"drop": 0.2}, "SR:12": {"garble": 1.}}})
+        self.assertEqual(faults.behaviour("CN"), {"latency": 0.1, "drop": 0.5})
+        self.assertEqual(faults.behaviour("SR:01"), {"latency": 0.1, "drop": 0.2})
+        self.assertEqual(faults.behaviour("SR:12"), {"latency": 0.1, "drop": 0.2, "garble": 1.})
+
+    def test_phases(self):
+        faults = FaultInjector({"phases": [{"duration": 10, "default": {"drop": 1.}},
+                                           {"duration": 10, "default": {"drop": 0.}}],
+                                "repeat": True})
+        self.assertEqual(faults.behaviour("CN"), {"drop": 1.})
+        faults.start -= 15
+        self.assertEqual(faults.behaviour("CN"), {"drop": 0.})
+        faults.start -= 10
+        self.assertEqual(faults.behaviour("CN"), {"drop": 1.})
+
+    def test_latency(self):
+        faults = FaultInjector({}, seed=1)
+        self.assertEqual(faults.latency({}), 0.)
+        self.assertEqual(faults.latency({"latency": 0.2}), 0.2)
+        for index in range(100):
+            self.assertTrue(0.1 <= faults.latency({"latency": {"distribution": "uniform", "low": 0.1, "high": 0.3}}) <= 0.3)
+            self.assertTrue(0.15 <= faults.latency({"latency": 0.2, "jitter": 0.05}) <= 0.25)
+            self.assertTrue(faults.latency({"latency": {"distribution": "normal", "mean": 0., "stddev": 1.}}) >= 0.)
+
+    def test_reproducible(self):
+        behaviour = {"drop": 0.5, "latency": {"distribution": "exponential", "mean": 0.1}}
+        first, second = FaultInjector({}, seed=7), FaultInjector({}, seed=7)
+        for index in range(20):
+            self.assertEqual(first.happens(behaviour, "drop"), second.happens(behaviour, "drop"))
+            self.assertEqual(first.latency(behaviour), second.latency(behaviour))
+
+    def test_corrupt(self):
+        faults = FaultInjector({}, seed=3)
+        self.assertEqual(faults.corrupt("*0000017000", {}), "*0000017000")
+        self.assertEqual(faults.corrupt("", {"garble": 1.}), "")
+        for index in range(50):
+            garbled = faults.corrupt("*0000017000", {"garble": 1.})
+            self.assertNotEqual(garbled, "*0000017000")
+            self.assertTrue(len(garbled) in (10, 11))
+            truncated = faults.corrupt("*0000017000", {"truncate": 1.})
+            self.assertTrue("*0000017000".startswith(truncated) and len(truncated) < 11)
+
+
+class SimulatedGeneratorTestCase(unittest.TestCase):
+
+    def test_waterFlow(self):
+        generator = SimulatedGenerator(rng=random.Random(5))
+        now = generator.lastStep
+        for minimum in (100, 181, 200):
+            generator.handle("SW:14:%d" % minimum, now)
+            flows = set()
+            for index in range(50):
+                now += 1.
+                flows.add(int(generator.handle("SR:15", now)[1:]))
+            # Noisy around the nominal flow, whatever the minimum
+            self.assertTrue(len(flows) > 1)
+            self.assertTrue(min(flows) > 200 and max(flows) <= 250)
+
+    def test_warmupInterval(self):
+        generator = SimulatedGenerator(rng=random.Random(5))
+        now = generator.lastStep
+        # Ignored like any malformed command, the generator still answers
+        with self.assertLogs("SeifertXrayHwSimulator", "WARNING"):
+            self.assertIsNone(generator.handle("WU:7,40", now))
+        self.assertEqual(generator.handle("WT", now), "*0000000000")
+        generator.handle("WU:1,40", now)
+        self.assertEqual(generator.handle("WT", now + 1.), "*0000000599")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,349 @@
+__author__="gabriele.giambartolomei@desy.de"
+__date__ ="October, 2026"
+__copyright__="Copyright (c) 2010-2026 European XFEL GmbH Hamburg. All rights reserved."
+
+'''Tests of the socket level communication with the Seifert X-ray generator'''
+
+import asyncio
+import gc
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from SeifertXrayHwSimulator import FaultInjector, serveClient
+from SeifertXrayPriority import POLL, SAFETY, PriorityLock
+from SeifertXrayTransport import AliasPlan, ReplyFramer, SeifertXrayAsyncTransport, SeifertXrayConnection
+
+
+class Simulator(object):
+    '''SeifertXrayHwSimulator serving on a free port, on an event loop thread of its own'''
+
+    def __init__(self, faults):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        injector = FaultInjector(faults, seed=1)
+        rng = random.Random(1)
+        self.server = asyncio.run_coroutine_threadsafe(asyncio.start_server(
+            lambda reader, writer: serveClient(reader, writer, injector, None, rng),
+            "localhost", 0), self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class AliasPlanTestCase(unittest.TestCase):
+
+    def test_write(self):
+        plan = AliasPlan("exposuretimer", "TP:3,{exposuretimer.hours},{exposuretimer.minutes},{exposuretimer.seconds};;;;")
+        values = {"exposuretimer.hours": 1, "exposuretimer.minutes": 2, "exposuretimer.seconds": 3}
+        self.assertEqual(plan.writeBytes(values.get), b"TP:3,1,2,3\n")
+        self.assertEqual(plan.writeMnemonic, "TP:3")
+        self.assertIsNone(plan.queryBytes)
+
+    def test_query(self):
+        plan = AliasPlan("current.target", ";;CN;*{current.target:d};")
+        self.assertIsNone(plan.writeParts)
+        self.assertEqual(plan.queryBytes, b"CN\n")
+        self.assertEqual(plan.parse(b"*0000017000"), 17000)
+        self.assertEqual(plan.parse(memoryview(bytearray(b"*0000000000"))), 0)
+        for reply in (b"0000017000", b"", b"*", b"*000017000", b"*00000170000", b"*-000017000",
+                      b"* 000017000", b"*00000#7000", b"*0000017000 "):
+            self.assertRaises(ValueError, plan.parse, reply)
+
+    def test_string(self):
+        plan = AliasPlan("version", ";;VR;*{version};")
+        self.assertEqual(plan.parse(b"*V 2.1"), "V 2.1")
+
+
+class ReplyFramerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.device, self.generator = socket.socketpair()
+        self.framer = ReplyFramer(size=64, maxFrame=16)
+
+    def tearDown(self):
+        self.device.close()
+        self.generator.close()
+
+    def receive(self, data):
+        self.generator.sendall(data)
+        self.framer.receive(self.device)
+
+    def frames(self):
+        frames = []
+        frame = self.framer.nextFrame()
+        while frame is not None:
+            frames.append(bytes(frame))
+            frame = self.framer.nextFrame()
+        return frames
+
+    def test_partial(self):
+        self.framer.begin()
+        self.receive(b"*00000")
+        self.assertEqual(self.frames(), [])
+        self.assertTrue(self.framer.pending())
+        self.receive(b"17000\n*01")
+        self.assertEqual(self.frames(), [b"*0000017000"])
+        self.framer.begin() # The rest is kept for the next exchange
+        self.receive(b"\n")
+        self.assertEqual(self.frames(), [b"*01"])
+        self.assertFalse(self.framer.pending())
+
+    def test_several(self):
+        self.framer.begin()
+        self.receive(b"*1\n*2\n\n*3\n")
+        self.assertEqual(self.frames(), [b"*1", b"*2", b"", b"*3"])
+
+    def test_garbage(self):
+        self.framer.begin()
+        self.receive(b"x" * 20)
+        self.assertEqual(self.frames(), [])
+        self.receive(b"yy\n*5\n")
+        self.assertEqual(self.frames(), [b"*5"])
+        self.assertEqual(self.framer.discarded, 23)
+        # A complete frame too long is dropped as well
+        self.receive(b"z" * 17 + b"\n*6\n")
+        self.assertEqual(self.frames(), [b"*6"])
+        self.assertEqual(self.framer.discarded, 41)
+
+    def test_full(self):
+        self.framer.begin()
+        self.receive(b"*1" * 32)
+        self.assertRaises(ValueError, self.framer.receive, self.device)
+
+    def test_clear(self):
+        self.framer.begin()
+        self.receive(b"*000")
+        self.framer.clear()
+        self.assertFalse(self.framer.pending())
+        self.receive(b"*7\n")
+        self.assertEqual(self.frames(), [b"*7"])
+        self.assertEqual(self.framer.discarded, 4)
+
+
+class SeifertXrayConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator = None
+        self.sock = None
+
+    def tearDown(self):
+        if self.sock is not None:
+            self.sock.close()
+        if self.simulator is not None:
+            self.simulator.stop()
+
+    def connect(self, faults, timeout):
+        self.simulator = Simulator(faults)
+        self.sock = socket.create_connection(("localhost", self.simulator.port))
+        connection = SeifertXrayConnection(timeout=timeout)
+        connection.attach(self.sock)
+        return connection
+
+    def test_lateReply(self):
+        # Late replies to CN must not be taken for the replies to SR:01
+        connection = self.connect({"commands": {"CN": {"latency": {"distribution": "uniform",
+                                                                    "low": 0., "high": 0.1}}}}, 0.05)
+        current = AliasPlan("current.target", ";;CN;*{current.target:d};")
+        statusWord1 = AliasPlan("sw.statusWord1", ";;SR:01;*{sw.statusWord1:d};")
+        timeouts = 0
+        for index in range(30):
+            try:
+                self.assertEqual(current.parse(connection.exchange(current.queryBytes, 1)[0]), 17000)
+            except socket.timeout:
+                timeouts += 1
+            # Like the device, not holding its lock
+            connection.settle()
+            start = time.time()
+            self.assertLess(statusWord1.parse(connection.exchange(statusWord1.queryBytes, 1)[0]), 256)
+            # The late replies have arrived, dropping them takes one short quiet window
+            self.assertLess(time.time() - start, 0.05 + 0.05)
+        self.assertGreater(timeouts, 0)
+        self.assertGreater(connection.framer.discarded, 0)
+
+    def test_resyncLimit(self):
+        device, generator = socket.socketpair()
+        connection = SeifertXrayConnection()
+        connection.socket = device # Not a TCP socket to attach
+        stop = threading.Event()
+
+        def babble():
+            while not stop.wait(0.01):
+                generator.sendall(b"*")
+
+        thread = threading.Thread(target=babble)
+        thread.start()
+        try:
+            start = time.time()
+            self.assertRaises(socket.error, connection.resync, 0.05)
+            self.assertLess(time.time() - start, 0.05 + connection.RESYNC_LIMIT + 0.05)
+        finally:
+            stop.set()
+            thread.join()
+            device.close()
+            generator.close()
+
+
+class SeifertXrayAsyncTransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # CN replies lost or late
+        self.simulator = Simulator({"commands": {"CN": {"drop": 0.3, "latency": {"distribution": "uniform",
+                                                                                   "low": 0., "high": 0.08}}}})
+        self.transport = SeifertXrayAsyncTransport("localhost", self.simulator.port, timeout=0.05)
+        self.transport.open()
+
+    def tearDown(self):
+        self.transport.close()
+        self.simulator.stop()
+
+    def test_lostReply(self):
+        current = AliasPlan("current.target", ";;CN;*{current.target:d};")
+        statusWord14 = AliasPlan("sw.statusWord14Actual", ";;SR:14;*{sw.statusWord14Actual:d};")
+        replies = {current: [], statusWord14: []}
+        for index in range(60):
+            plan = (current, statusWord14)[index % 2]
+            try:
+                replies[plan].append(plan.parse(self.transport.exchange(plan.queryBytes, 1)[0]))
+            except socket.timeout:
+                pass
+        self.assertEqual(set(replies[current]), set([17000]))
+        self.assertEqual(set(replies[statusWord14]), set([100]))
+        # Back in sync after every lost reply
+        self.assertGreater(len(replies[statusWord14]), 20)
+
+    def test_concurrentExchanges(self):
+        # A lost reply of one exchange must not shift the replies of the other
+        current = AliasPlan("current.target", ";;CN;*{current.target:d};")
+        statusWord14 = AliasPlan("sw.statusWord14Actual", ";;SR:14;*{sw.statusWord14Actual:d};")
+        replies = {current: [], statusWord14: []}
+
+        async def exchange(plan):
+            try:
+                frames = await self.transport.exchangeAsync(plan.queryBytes, 1)
+            except socket.timeout:
+                return
+            replies[plan].append(plan.parse(frames[0]))
+
+        async def exchangeBoth():
+            await asyncio.gather(exchange(current), exchange(statusWord14))
+
+        for index in range(30):
+            self.transport.run(exchangeBoth(), 1.)
+        self.assertEqual(set(replies[current]), set([17000]))
+        self.assertEqual(set(replies[statusWord14]), set([100]))
+        self.assertGreater(len(replies[statusWord14]), 10)
+
+    def test_connectionLost(self):
+        statusWord14 = AliasPlan("sw.statusWord14Actual", ";;SR:14;*{sw.statusWord14Actual:d};")
+
+        async def abort():
+            self.transport.writer.transport.abort()
+
+        self.transport.run(abort(), 1.)
+        with self.assertNoLogs("asyncio", "ERROR"):
+            self.assertRaises(socket.error, self.transport.exchange, statusWord14.queryBytes, 1)
+            self.transport.close()
+            # Logged when an exception nobody retrieved is collected
+            gc.collect()
+
+    def test_sendAfterResync(self):
+        statusWord14 = AliasPlan("sw.statusWord14Actual", ";;SR:14;*{sw.statusWord14Actual:d};")
+        self.transport.resync(0.01)
+        self.assertFalse(self.transport.desynced)
+        self.assertEqual(statusWord14.parse(self.transport.exchange(statusWord14.queryBytes, 1)[0]), 100)
+
+
+class SafetyLatencyTestCase(unittest.TestCase):
+    '''HV:0 sent while a poll query times out, like GeSeifertXray.writeCommand does'''
+
+    TIMEOUT = 0.2
+
+    def setUp(self):
+        # CN is never answered
+        self.simulator = Simulator({"commands": {"CN": {"drop": 1.}}})
+        self.current = AliasPlan("current.target", ";;CN;*{current.target:d};")
+        self.statusWord1 = AliasPlan("sw.statusWord1", ";;SR:01;*{sw.statusWord1:d};")
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def sendLater(self, delay, send):
+        ''' Return a thread calling send after delay, and the list receiving its latency '''
+        latency = []
+
+        def sendTimed():
+            time.sleep(delay)
+            start = time.perf_counter()
+            send()
+            latency.append(time.perf_counter() - start)
+
+        thread = threading.Thread(target=sendTimed)
+        thread.start()
+        return thread, latency
+
+    def test_socket(self):
+        sock = socket.create_connection(("localhost", self.simulator.port))
+        try:
+            connection = SeifertXrayConnection(timeout=self.TIMEOUT)
+            connection.attach(sock)
+            ioLock = PriorityLock()
+
+            def switchOff():
+                with ioLock.hold(SAFETY):
+                    connection.send(b"HV:0\n")
+
+            def poll(plan):
+                connection.settle()
+                with ioLock.hold(POLL):
+                    return plan.parse(connection.exchange(plan.queryBytes, 1)[0])
+
+            # During the exchange, HV:0 waits for it at most
+            thread, during = self.sendLater(0.05, switchOff)
+            self.assertRaises(socket.timeout, poll, self.current)
+            thread.join()
+            self.assertLess(during[0], self.TIMEOUT)
+            # While the next query waits for the late replies, HV:0 does not wait
+            thread, after = self.sendLater(0.05, switchOff)
+            self.assertLess(poll(self.statusWord1), 256)
+            thread.join()
+            self.assertLess(after[0], 0.02)
+        finally:
+            sock.close()
+
+    def test_asyncio(self):
+        transport = SeifertXrayAsyncTransport("localhost", self.simulator.port, timeout=self.TIMEOUT)
+        transport.open()
+        try:
+            # A write does not wait for the exchange in progress
+            thread, during = self.sendLater(0.05, lambda: transport.send(b"HV:0\n"))
+            self.assertRaises(socket.timeout, transport.exchange, self.current.queryBytes, 1)
+            thread.join()
+            self.assertLess(during[0], 0.02)
+            # Nor for the quiet line before the next one
+            thread, after = self.sendLater(0.05, lambda: transport.send(b"HV:0\n"))
+            self.assertLess(self.statusWord1.parse(transport.exchange(self.statusWord1.queryBytes, 1)[0]), 256)
+            thread.join()
+            self.assertLess(after[0], 0.02)
+        finally:
+            transport.close()
+
+if __name__ == '__main__':
+    unittest.main()